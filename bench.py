@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import hashlib
+import time
+import random
+import argparse
+import platform
+import resource
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import convert
+from sink import Sink
+
+# --- BENCHMARK SUITE ---
+# Runs the conversion cores outside Telegram on a deterministic synthetic
+# corpus and writes wall time, throughput and peak memory to JSON.
+#
+#   python bench.py                          # 1k, 100k, 1M contacts, every case
+#   python bench.py --sizes 100k --cases t2v,split_vcf --out new.json
+#   python bench.py --compare old.json       # exits 1 on a regression
+#
+# Each case runs in a fresh process so ru_maxrss is that case's own peak.
+# The *_dedup_disk cases force the external sort-merge dedup (normally only
+# used above DEDUP_MEM_BYTES) and fail if it disagrees with the in-memory one.
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+SEED = 1337
+SPLIT_PARTS = 10
+
+# --- CORPUS ---
+def fake_number(rng):
+    cc, rest = rng.choice(("91", "1", "44", "62", "880")), str(rng.randrange(10**9, 10**10))
+    style = rng.randrange(6)
+    if style == 0: return f"+{cc}{rest}"
+    if style == 1: return f"{cc}{rest}"
+    if style == 2: return f"+{cc} {rest[:5]} {rest[5:]}"
+    if style == 3: return f"+{cc}-{rest[:3]}-{rest[3:6]}-{rest[6:]}"
+    if style == 4: return f"({cc}) {rest}"
+    return rest
+
+def write_corpus(folder, n):
+    # Same seed -> byte-identical files, so results stay comparable across runs.
+    # About 1 in 20 numbers repeats an earlier one, for the dedup cases.
+    rng, nums = random.Random(SEED + n), []
+    for i in range(n):
+        nums.append(rng.choice(nums) if nums and rng.random() < 0.05 else fake_number(rng))
+    txt, vcf = os.path.join(folder, f"{n}.txt"), os.path.join(folder, f"{n}.vcf")
+    with open(txt, 'w') as f:
+        for i, num in enumerate(nums):
+            f.write(f"{num}\n")
+            if i % 97 == 0: f.write("\n")
+    with open(vcf, 'w') as f:
+        for i, num in enumerate(nums, 1):
+            f.write(f"BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Contact {i}\r\nTEL;TYPE=CELL:{num}\r\nEND:VCARD\r\n")
+    return txt, vcf
+
+def corpus(folder, n):
+    os.makedirs(folder, exist_ok=True)
+    txt, vcf = os.path.join(folder, f"{n}.txt"), os.path.join(folder, f"{n}.vcf")
+    if not (os.path.exists(txt) and os.path.exists(vcf)): write_corpus(folder, n)
+    return txt, vcf
+
+# --- CASES ---
+def run_split(path, is_vcf, spill_dir):
+    index = convert.index_records(path, is_vcf)
+    limit, size, count = max(1, -(-len(index) // SPLIT_PARTS)), os.path.getsize(path), 0
+    for i in range(-(-len(index) // limit)):
+        start, end = convert.part_bounds(index, size, limit, i)
+        out = convert.write_part(path, start, end, is_vcf, Sink(f"part {i+1}", spill_dir))
+        count += out.count
+        out.discard()
+    return count
+
+def merge_digest(src, dedup_mem_bytes, spill_dir):
+    # -> (sha256 of the deduped merge, records, duplicates removed)
+    convert.DEDUP_MEM_BYTES = dedup_mem_bytes
+    out, removed = convert.merge_files(src, os.path.splitext(src[0])[1], True, Sink("bench_check", spill_dir))
+    h = hashlib.sha256()
+    with out.open() as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+    out.discard()
+    return h.hexdigest(), out.count, removed
+
+def check_dedup_disk(case, txt, vcf, spill_dir):
+    src = [txt, txt] if "_txt" in case else [vcf, vcf]
+    mem, disk = merge_digest(src, sys.maxsize, spill_dir), merge_digest(src, 0, spill_dir)
+    if mem != disk: raise RuntimeError(f"{case}: on-disk dedup {disk[1:]} differs from in-memory {mem[1:]}")
+
+def run_case(case, txt, vcf, spill_dir):
+    # -> (records produced, input bytes)
+    sink = Sink(f"bench_{case}", spill_dir)
+    if case == "t2v": out, src = convert.t2v_file(txt, "Bench", sink), [txt]
+    elif case == "v2t": out, src = convert.v2t_file(vcf, sink), [vcf]
+    elif case == "ren_ctc": out, src = convert.ren_ctc_file(vcf, "Bench", sink), [vcf]
+    elif case.startswith("merge_"):
+        src = [txt, txt] if "_txt" in case else [vcf, vcf]
+        # 0 sends every merge down the external sort-merge path
+        if case.endswith("_disk"): convert.DEDUP_MEM_BYTES = 0
+        out, _ = convert.merge_files(src, os.path.splitext(src[0])[1], "_dedup" in case, sink)
+    elif case in ("split_txt", "split_vcf"):
+        path = vcf if case == "split_vcf" else txt
+        return run_split(path, path == vcf, spill_dir), os.path.getsize(path)
+    else: raise ValueError(f"unknown case {case}")
+    out.discard()
+    return out.count, sum(os.path.getsize(p) for p in src)
+
+CASES = ["t2v", "v2t", "ren_ctc", "merge_txt", "merge_txt_dedup", "merge_vcf", "merge_vcf_dedup",
+         "merge_txt_dedup_disk", "merge_vcf_dedup_disk", "split_txt", "split_vcf"]
+
+def measure(case, n, txt, vcf, repeat, spill_dir):
+    if case.endswith("_dedup_disk"): check_dedup_disk(case, txt, vcf, spill_dir)
+    walls = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        records, bytes_in = run_case(case, txt, vcf, spill_dir)
+        walls.append(time.perf_counter() - t0)
+    # Separate traced run: tracemalloc slows the cores down too much to time them
+    tracemalloc.start()
+    run_case(case, txt, vcf, spill_dir)
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    wall = min(walls)
+    return {
+        "case": case, "contacts": n, "records": records, "bytes_in": bytes_in,
+        "wall_s": round(wall, 4), "wall_all_s": [round(w, 4) for w in walls],
+        "records_per_s": round(records / wall, 1), "mb_per_s": round(bytes_in / wall / 1e6, 2),
+        "tracemalloc_peak_bytes": traced_peak,
+        "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+# --- REPORTING ---
+def compare(old, new, threshold):
+    # Flags cases whose best wall time got more than threshold slower
+    base = {(r["case"], r["contacts"]): r for r in old["results"]}
+    regressions = []
+    for r in new["results"]:
+        b = base.get((r["case"], r["contacts"]))
+        if not b: continue
+        delta = r["wall_s"] / b["wall_s"] - 1 if b["wall_s"] else 0
+        mem = r["tracemalloc_peak_bytes"] / b["tracemalloc_peak_bytes"] - 1 if b["tracemalloc_peak_bytes"] else 0
+        flag = "  REGRESSION" if delta > threshold else ""
+        print(f"{r['case']:>20} {r['contacts']:>8}  {b['wall_s']:>9.3f}s -> {r['wall_s']:>9.3f}s  {delta:+7.1%}  mem {mem:+7.1%}{flag}")
+        if flag: regressions.append(r)
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the conversion cores on a synthetic corpus")
+    ap.add_argument("--sizes", default=",".join(SIZES), help="comma list of " + ", ".join(SIZES))
+    ap.add_argument("--cases", default=",".join(CASES), help="comma list of " + ", ".join(CASES))
+    ap.add_argument("--repeat", type=int, default=3, help="timed runs per case, best one is reported")
+    ap.add_argument("--corpus", default=".bench_corpus", help="corpus cache folder (regenerated if missing)")
+    ap.add_argument("--out", default="bench.json")
+    ap.add_argument("--compare", help="earlier results JSON to diff against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before --compare fails")
+    args = ap.parse_args()
+
+    sizes, cases = args.sizes.split(","), args.cases.split(",")
+    spill_dir = os.path.join(args.corpus, "spill")
+    os.makedirs(spill_dir, exist_ok=True)
+    results = []
+    for label in sizes:
+        n = SIZES[label]
+        txt, vcf = corpus(args.corpus, n)
+        for case in cases:
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as ex:
+                r = ex.submit(measure, case, n, txt, vcf, args.repeat, spill_dir).result()
+            results.append(r)
+            print(f"{case:>20} {label:>5}  {r['wall_s']:>9.3f}s  {r['records_per_s']:>12,.0f} rec/s  "
+                  f"{r['mb_per_s']:>7.2f} MB/s  peak {r['tracemalloc_peak_bytes'] / 1e6:>7.1f} MB  rss {r['maxrss_kb'] / 1e3:>7.1f} MB")
+
+    report = {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "platform": platform.platform(), "cpu_count": os.cpu_count(), "repeat": args.repeat},
+        "results": results,
+    }
+    with open(args.out, 'w') as f: json.dump(report, f, indent=2)
+    print(f"📝 Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f: old = json.load(f)
+        if compare(old, report, args.threshold): sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import asyncio
+import tempfile
+import zipfile
+import metrics
+from sink import Output, SINK_DIR
+
+# --- BUNDLE (ZIP) OUTPUT ---
+# Multi-part jobs can stream every generated part into one compressed archive
+# as it is produced and send a single document instead of thousands.
+
+BUNDLE_LEVEL = int(os.getenv("BUNDLE_LEVEL", "6"))
+
+class Bundle:
+    def __init__(self, name, spill_dir=SINK_DIR):
+        fd, self.path = tempfile.mkstemp(suffix=".zip", dir=spill_dir)
+        os.close(fd)
+        self.zf = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED, compresslevel=BUNDLE_LEVEL)
+        self.name, self.count, self.seen = name, 0, set()
+
+    def _arcname(self, name):
+        base, ext = os.path.splitext(name)
+        arc, n = name, 1
+        while arc in self.seen:
+            n += 1
+            arc = f"{base} ({n}){ext}"
+        self.seen.add(arc)
+        return arc
+
+    def add(self, out):
+        arc = self._arcname(out.name)
+        if out.data is not None: self.zf.writestr(arc, out.data)
+        else: self.zf.write(out.path, arc)
+        self.count += out.count
+
+    async def put(self, i, out):
+        # Pipeline upload stage: compress off the event loop (zlib drops the GIL)
+        try:
+            with metrics.phase("bundle"): await asyncio.to_thread(self.add, out)
+        finally:
+            out.discard()
+
+    def close(self):
+        self.zf.close()
+        return Output(self.name, path=self.path, count=self.count)
+
+    def abort(self):
+        self.zf.close()
+        if os.path.exists(self.path): os.remove(self.path)
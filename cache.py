@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+# --- RESULT CACHE ---
+# Keyed by Telegram's file_unique_id, which is the same for the same file no
+# matter who sends it or when.
+#   inputs:  unique id -> a hardlinked copy under CACHE_DIR, LRU-trimmed to
+#            CACHE_BYTES, so a re-sent source file is never downloaded again
+#   outputs: (tool, params, source unique ids) -> file_ids of the documents we
+#            uploaded, so an identical re-run is answered by resending them
+# CACHE_BYTES=0 turns off the input side, CACHE_OUTPUTS=0 the output side.
+
+CACHE_DIR = os.path.abspath(os.getenv("CACHE_DIR", "cache"))
+CACHE_BYTES = int(os.getenv("CACHE_BYTES", str(1 << 30)))
+CACHE_OUTPUTS = int(os.getenv("CACHE_OUTPUTS", "10000"))
+
+# Bump when converter output changes, so stale uploads are not resent
+OUTPUT_VERSION = 1
+
+def link_or_copy(src, dst):
+    if os.path.exists(dst): os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+class FileCache:
+    def __init__(self, folder=CACHE_DIR, max_bytes=CACHE_BYTES, max_outputs=CACHE_OUTPUTS):
+        self.folder, self.max_bytes, self.max_outputs = folder, max_bytes, max_outputs
+        os.makedirs(os.path.join(folder, "inputs"), exist_ok=True)
+        # Shared by the bot and ROLE=worker processes: WAL and a long busy timeout, like jobs.db
+        self.db = sqlite3.connect(os.path.join(folder, "cache.db"), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # Inputs are cached from to_thread workers, outputs from the event loop:
+        # one connection, so every use goes through this lock
+        self.lock = threading.RLock()
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS inputs (uid TEXT PRIMARY KEY, size INTEGER, used REAL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS outputs (key TEXT PRIMARY KEY, file_ids TEXT, meta TEXT, used REAL)")
+
+    # --- inputs ---
+    def _input_path(self, unique_id):
+        return os.path.join(self.folder, "inputs", unique_id)
+
+    def fetch_input(self, unique_id, dest):
+        # Links the cached copy to dest; None on a miss
+        if not self.max_bytes or not unique_id: return None
+        src = self._input_path(unique_id)
+        if not os.path.exists(src):
+            with self.lock, self.db: self.db.execute("DELETE FROM inputs WHERE uid = ?", (unique_id,))
+            return None
+        link_or_copy(src, dest)
+        with self.lock, self.db: self.db.execute("UPDATE inputs SET used = ? WHERE uid = ?", (time.time(), unique_id))
+        return dest
+
+    def store_input(self, unique_id, path):
+        if not self.max_bytes or not unique_id or os.path.getsize(path) > self.max_bytes: return
+        link_or_copy(path, self._input_path(unique_id))
+        with self.lock:
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO inputs VALUES (?, ?, ?)", (unique_id, os.path.getsize(path), time.time()))
+            self._trim_inputs()
+
+    def _trim_inputs(self):
+        # Caller holds self.lock
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM inputs").fetchone()[0]
+        if total <= self.max_bytes: return
+        for unique_id, size in self.db.execute("SELECT uid, size FROM inputs ORDER BY used").fetchall():
+            if total <= self.max_bytes: break
+            try:
+                os.remove(self._input_path(unique_id))
+            except OSError:
+                pass
+            with self.db: self.db.execute("DELETE FROM inputs WHERE uid = ?", (unique_id,))
+            total -= size
+
+    # --- outputs ---
+    @staticmethod
+    def key(tool, unique_ids, *params):
+        raw = json.dumps([OUTPUT_VERSION, tool, list(unique_ids), *params], default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get_outputs(self, key):
+        # (file_ids, meta) or None
+        if not self.max_outputs or not key: return None
+        with self.lock:
+            row = self.db.execute("SELECT file_ids, meta FROM outputs WHERE key = ?", (key,)).fetchone()
+            if not row: return None
+            with self.db: self.db.execute("UPDATE outputs SET used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put_outputs(self, key, file_ids, meta=None):
+        if not self.max_outputs or not key or not file_ids or None in file_ids: return
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)",
+                            (key, json.dumps(file_ids), json.dumps(meta or {}), time.time()))
+            self.db.execute("DELETE FROM outputs WHERE key IN (SELECT key FROM outputs ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                            (self.max_outputs,))
+
+    def forget_outputs(self, key):
+        with self.lock, self.db: self.db.execute("DELETE FROM outputs WHERE key = ?", (key,))
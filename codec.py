@@ -0,0 +1,99 @@
+import os
+from phone import normalize, tel_value
+
+# --- STREAMING vCard / TXT CODEC ---
+# Readers are generators (one record at a time), writers buffer small strings
+# and flush them in large joined blocks, so memory stays flat and output time
+# stays linear no matter how big the input is.
+
+FLUSH_AT = int(os.getenv("CODEC_FLUSH_AT", str(1 << 16)))
+CHUNK_HINT = int(os.getenv("CODEC_CHUNK_HINT", str(1 << 18)))
+
+# --- READERS ---
+
+def iter_lines(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.strip()
+            if line: yield line
+
+def iter_line_chunks(path, hint=CHUNK_HINT):
+    # Raw lines in blocks of ~hint bytes, for the phone.* batch helpers
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        while chunk := f.readlines(hint): yield chunk
+
+def iter_vcards(path):
+    # Yields each card as a list of raw lines (BEGIN:VCARD ... END:VCARD)
+    card = None
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            s = line.strip()
+            if s.startswith("BEGIN:VCARD"):
+                card = []
+            if card is None: continue
+            card.append(line if line.endswith('\n') else line + '\n')
+            if s.startswith("END:VCARD"):
+                yield card
+                card = None
+
+def iter_tels(path):
+    for card in iter_vcards(path):
+        for line in card:
+            num = tel_value(line)
+            if num is not None: yield num
+
+def iter_navy(lines):
+    # Admin/Navy format: a name line followed by its number line
+    tn = None
+    for l in lines:
+        l = l.strip()
+        if not l: continue
+        num = normalize(l)
+        # Length of the line as sent ('+' included), like the original check
+        if num and len(l) > 5:
+            if tn:
+                yield tn, num
+                tn = None
+        else: tn = l
+
+# --- WRITERS ---
+
+class Writer:
+    def __init__(self, f, flush_at=FLUSH_AT):
+        self.f, self.flush_at = f, flush_at
+        self.buf, self.size, self.count = [], 0, 0
+
+    def write(self, s):
+        self.buf.append(s)
+        self.size += len(s)
+        if self.size >= self.flush_at: self.flush()
+
+    def record(self, s):
+        self.write(s)
+        self.count += 1
+
+    def flush(self):
+        if self.buf:
+            self.f.write(''.join(self.buf))
+            self.buf.clear()
+        self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+class TxtWriter(Writer):
+    def line(self, s):
+        self.write(s + "\n")
+        self.count += 1
+
+class VcfWriter(Writer):
+    def contact(self, name, num):
+        self.write(f"BEGIN:VCARD\nVERSION:3.0\nFN:{name}\nTEL;TYPE=CELL:{num}\nEND:VCARD\n")
+        self.count += 1
+
+    def card(self, lines):
+        self.write(''.join(lines))
+        self.count += 1
@@ -0,0 +1,234 @@
+import os
+import re
+import mmap
+from array import array
+from codec import iter_lines, iter_line_chunks, iter_vcards, iter_tels, iter_navy, Writer, TxtWriter, VcfWriter
+from phone import plus, tel_value, normalize_lines, plus_lines, normalize_card
+from dedup import number_key, NumberSet, duplicate_bitmap, is_marked, DEDUP_MEM_BYTES
+from sink import Sink
+
+# --- CONVERSION CORES ---
+# Plain functions of (input paths, output paths, params) so they can run in a
+# worker process. dst is a sink.Sink and always comes last; each returns the
+# finished sink.Output with its record count.
+
+def t2v_file(src, c_name_base, dst):
+    counter = 0
+    with dst, VcfWriter(dst) as w:
+        for chunk in iter_line_chunks(src):
+            # Plus Sign Magic Here
+            for num in plus_lines(chunk):
+                counter += 1
+                w.contact(f"{c_name_base} {counter}", num)
+    return dst.output(w.count)
+
+def ren_ctc_file(src, c_name_base, dst):
+    counter = 1
+    with dst, VcfWriter(dst) as w:
+        for card in iter_vcards(src):
+            for j, line in enumerate(card):
+                if line.startswith("FN:"):
+                    card[j] = f"FN:{c_name_base} {counter}\n"
+                    counter += 1
+            # Plus Sign Magic Here
+            w.card(normalize_card(card, force=True))
+    return dst.output(w.count)
+
+def v2t_file(src, dst):
+    with dst, TxtWriter(dst) as w:
+        # Plus Sign Magic Here
+        for num in iter_tels(src): w.line(plus(num))
+    return dst.output(w.count)
+
+def iter_merge_records(srcs, ext, keys=True):
+    # (normalized record text, number key or None) for every input record;
+    # keys=False skips the number lookup and always gives None
+    for path in srcs:
+        if ext == ".vcf":
+            for card in iter_vcards(path):
+                # Add Plus Sign to VCF Numbers
+                card = normalize_card(card)
+                if not keys:
+                    yield ''.join(card), None
+                    continue
+                tel = next((v for v in map(tel_value, card) if v is not None), None)
+                yield ''.join(card), number_key(tel)
+        else:
+            for chunk in iter_line_chunks(path):
+                # Add Plus Sign to TXT Numbers
+                for line in normalize_lines(chunk):
+                    if line: yield line + "\n", number_key(line) if keys and line[0] == '+' else None
+
+class MergeStream:
+    # Merged, normalized record texts; with dedup the first occurrence of a
+    # number wins and .removed counts the rest
+    def __init__(self, srcs, ext, dedup, spill_dir=None):
+        self.srcs, self.ext, self.dedup, self.spill_dir = srcs, ext, dedup, spill_dir
+        self.removed = 0
+
+    def __iter__(self):
+        records = iter_merge_records(self.srcs, self.ext, self.dedup)
+        if not self.dedup:
+            for text, _ in records: yield text
+        elif sum(os.path.getsize(p) for p in self.srcs) <= DEDUP_MEM_BYTES:
+            seen = NumberSet()
+            for text, key in records:
+                if key is not None and not seen.add(key):
+                    self.removed += 1
+                    continue
+                yield text
+        else:
+            dups = duplicate_bitmap((key for _, key in records), self.spill_dir)
+            for seq, (text, _) in enumerate(iter_merge_records(self.srcs, self.ext, False)):
+                if is_marked(dups, seq):
+                    self.removed += 1
+                    continue
+                yield text
+
+def merge_files(srcs, ext, dedup, dst):
+    # Returns (Output, duplicates removed)
+    records = MergeStream(srcs, ext, dedup, dst.spill_dir)
+    with dst, Writer(dst) as w:
+        for text in records: w.record(text)
+    return dst.output(w.count), records.removed
+
+# --- CHAINED PIPELINE ---
+# merge -> t2v -> ren_ctc -> split fused into one record stream inside a single
+# worker call: intermediate results are never written out, re-parsed or sent
+# through Telegram. Steps always run in this order.
+
+PIPELINE_STEPS = ("merge", "t2v", "ren_ctc", "split")
+
+def chain_t2v(records, c_name_base):
+    for counter, line in enumerate(records, 1):
+        # Plus Sign Magic Here
+        yield f"BEGIN:VCARD\nVERSION:3.0\nFN:{c_name_base} {counter}\nTEL;TYPE=CELL:{plus(line)}\nEND:VCARD\n"
+
+def chain_ren_ctc(cards, c_name_base):
+    counter = 1
+    for card in cards:
+        lines = card.splitlines(True)
+        for j, line in enumerate(lines):
+            if line.startswith("FN:"):
+                lines[j] = f"FN:{c_name_base} {counter}\n"
+                counter += 1
+        # Like ren_ctc_file: every TEL value gets the Plus Sign
+        yield ''.join(normalize_card(lines, force=True))
+
+def chain_files(srcs, ext, steps, c_name_base, dedup, split_count, out_base, dst):
+    # Returns ([Output, ...], duplicates removed); dst becomes the first output
+    records = MergeStream(srcs, ext, dedup, dst.spill_dir)
+    stream, out_ext = iter(records), ext
+    if "t2v" in steps: stream, out_ext = chain_t2v(stream, c_name_base), ".vcf"
+    if "ren_ctc" in steps: stream = chain_ren_ctc(stream, c_name_base)
+    limit = split_count if "split" in steps else 0
+    # Split parts all spill to their own files: only paths go back through
+    # the pool, and the bot never holds every part in memory at once
+    if limit: dst.spill_at = 0
+
+    outs, part, w = [], None, None
+    try:
+        for text in stream:
+            if w is None:
+                name = f"{out_base} {len(outs)+1}{out_ext}" if limit else f"{out_base}{out_ext}"
+                part = dst if not outs else Sink(name, dst.spill_dir, dst.spill_at)
+                part.name, w = name, Writer(part)
+            w.record(text)
+            if limit and w.count >= limit:
+                w.flush()
+                outs.append(part.output(w.count))
+                w = None
+        if w is not None:
+            w.flush()
+            outs.append(part.output(w.count))
+    except:
+        if w is not None: part.abort()
+        for out in outs: out.discard()
+        raise
+    return outs, records.removed
+
+# Record starts: BEGIN:VCARD for VCF, every non-blank line for TXT
+TXT_RECORD = re.compile(rb'^[ \t\r\f\v]*[^\s]', re.M)
+
+def scan_records(buf, end, is_vcf, idx, base=0):
+    # Appends base + offset of every record start in buf[:end]
+    if is_vcf:
+        pos = buf.find(b"BEGIN:VCARD", 0, end)
+        while pos != -1:
+            idx.append(base + pos)
+            pos = buf.find(b"BEGIN:VCARD", pos + 11, end)
+    else:
+        idx.extend(base + mt.start() for mt in TXT_RECORD.finditer(buf, 0, end))
+
+def index_records(path, is_vcf):
+    # One pass over the file -> compact array of record start offsets
+    idx = array('Q')
+    if not os.path.getsize(path): return idx
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        scan_records(mm, len(mm), is_vcf, idx)
+    return idx
+
+class RecordIndexer:
+    # index_records for a file that is still arriving: feed() the chunks in
+    # order, finish() once the last one is in. Only whole lines are scanned;
+    # a partial last line is carried over to the next chunk.
+    def __init__(self, is_vcf):
+        self.is_vcf, self.idx, self.base, self.tail = is_vcf, array('Q'), 0, b""
+
+    def feed(self, chunk):
+        buf = self.tail + chunk if self.tail else bytes(chunk)
+        cut = buf.rfind(b"\n") + 1
+        scan_records(buf, cut, self.is_vcf, self.idx, self.base)
+        self.tail, self.base = buf[cut:], self.base + cut
+
+    def finish(self):
+        if self.tail: scan_records(self.tail, len(self.tail), self.is_vcf, self.idx, self.base)
+        self.tail = b""
+        return self.idx
+
+def part_bounds(idx, size, limit, i):
+    end = (i+1)*limit
+    return idx[i*limit], idx[end] if end < len(idx) else size
+
+PART_CHUNK = 1 << 20
+
+def write_part(path, start, end, is_vcf, dst):
+    # Cuts bytes [start, end) straight from the mapped file in ~1 MB line-aligned
+    # blocks, normalizing each block with one batch call as it writes
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+         dst, Writer(dst) as w:
+        pos = start
+        while pos < end:
+            stop = min(end, pos + PART_CHUNK)
+            if stop < end:
+                nl = mm.find(b"\n", stop, end)
+                stop = end if nl == -1 else nl + 1
+            lines = mm[pos:stop].decode('utf-8', 'ignore').splitlines(True)
+            pos = stop
+            if is_vcf:
+                # Add Plus Sign to all VCF Numbers; every other line (folded
+                # continuations, blank lines) is copied as it is
+                card_lines = normalize_card(lines)
+                w.write(''.join(card_lines))
+                w.count += sum(1 for l in card_lines if l.startswith("BEGIN:VCARD"))
+            else:
+                # Add Plus Sign to all TXT Numbers
+                for line in normalize_lines(lines):
+                    if line: w.record(line + "\n")
+    return dst.output(w.count)
+
+def text_to_txt(text, dst):
+    with dst, TxtWriter(dst) as w:
+        for line in normalize_lines(text.splitlines()): w.line(line)
+    return dst.output(w.count)
+
+def navy_to_vcf(text, dst):
+    with dst, VcfWriter(dst) as w:
+        for name, num in iter_navy(text.splitlines()): w.contact(name, num)
+    return dst.output(w.count)
+
+def navy_file(src, dst):
+    # Same pairing straight off the file, one line at a time
+    with dst, VcfWriter(dst) as w:
+        for name, num in iter_navy(iter_lines(src)): w.contact(name, num)
+    return dst.output(w.count)
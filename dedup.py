@@ -0,0 +1,94 @@
+import os
+import heapq
+import tempfile
+from array import array
+from sink import SINK_DIR
+from phone import digits
+
+# --- DUPLICATE NUMBER TRACKING ---
+# Numbers become 64-bit keys ("1" + digits, so leading zeros and length are
+# kept). In memory they live in a NumberSet hash table of 64-bit slots; inputs
+# over DEDUP_MEM_BYTES use an external sort-merge on disk instead, which only
+# keeps one bit per record in RAM.
+
+DEDUP_MEM_BYTES = int(os.getenv("DEDUP_MEM_BYTES", str(128 << 20)))
+DEDUP_RUN_PAIRS = int(os.getenv("DEDUP_RUN_PAIRS", str(1 << 18)))
+
+def number_key(num):
+    d = digits(num) if num else None
+    return int("1" + d) if d and len(d) <= 18 else None
+
+class NumberSet:
+    # Open-addressing hash set stored in one array('Q'): 8 bytes per slot
+    # instead of a Python int object per number. Keys are never 0, so 0 marks
+    # an empty slot.
+    def __init__(self, capacity=1 << 16):
+        self.slots, self.mask, self.n = array('Q', bytes(8 * capacity)), capacity - 1, 0
+
+    def _probe(self, key):
+        slots, mask = self.slots, self.mask
+        i = (key * 0x9E3779B97F4A7C15 >> 29) & mask
+        while slots[i] and slots[i] != key: i = (i + 1) & mask
+        return i
+
+    def __contains__(self, key):
+        return self.slots[self._probe(key)] == key
+
+    def add(self, key):
+        # True when the key is new
+        i = self._probe(key)
+        if self.slots[i]: return False
+        self.slots[i] = key
+        self.n += 1
+        if self.n * 3 > self.mask * 2: self._grow()
+        return True
+
+    def _grow(self):
+        old = self.slots
+        self.slots, self.mask, self.n = array('Q', bytes(16 * len(old))), 2 * len(old) - 1, 0
+        for key in old:
+            if key: self.add(key)
+
+    def __len__(self):
+        return self.n
+
+def _write_run(pairs, folder):
+    pairs.sort()
+    flat = array('Q')
+    for key, seq in pairs: flat.extend((key, seq))
+    fd, path = tempfile.mkstemp(suffix=".run", dir=folder)
+    with os.fdopen(fd, 'wb') as f: flat.tofile(f)
+    return path
+
+def _read_run(path, block=1 << 15):
+    with open(path, 'rb') as f:
+        while True:
+            flat = array('Q')
+            try:
+                flat.fromfile(f, block * 2)
+            except EOFError:
+                pass
+            if not flat: return
+            for j in range(0, len(flat), 2): yield flat[j], flat[j+1]
+
+def duplicate_bitmap(keys, spill_dir=SINK_DIR, run_pairs=DEDUP_RUN_PAIRS):
+    # keys: one key (or None) per record, in output order. Returns a bitmap
+    # with bit seq set for every record whose key appeared at an earlier seq.
+    with tempfile.TemporaryDirectory(dir=spill_dir) as folder:
+        runs, pairs, n = [], [], 0
+        for seq, key in enumerate(keys):
+            n = seq + 1
+            if key is None: continue
+            pairs.append((key, seq))
+            if len(pairs) >= run_pairs:
+                runs.append(_write_run(pairs, folder))
+                pairs = []
+        if pairs: runs.append(_write_run(pairs, folder))
+        dups, last = bytearray((n + 7) // 8), None
+        for key, seq in heapq.merge(*(_read_run(p) for p in runs)):
+            if key == last: dups[seq >> 3] |= 1 << (seq & 7)
+            last = key
+    return dups
+
+def is_marked(bitmap, seq):
+    return bitmap[seq >> 3] >> (seq & 7) & 1
@@ -0,0 +1,148 @@
+import os
+import time
+import sqlite3
+import asyncio
+import itertools
+import metrics
+
+# --- DOWNLOAD MANAGER ---
+# Documents start downloading the moment they arrive. Concurrency is capped per
+# user and globally; the session only keeps the tasks, in upload order. With a
+# cache.FileCache, files seen before are linked from the cache instead. Given a
+# feed callback, the file is streamed instead and every chunk is handed to feed
+# as it is written, so parsing finishes together with the download. Files land
+# in the given folder (the session's scratch directory) under a sequence-prefixed
+# name, so a user sending two files with the same name keeps both.
+
+DL_GLOBAL_LIMIT = int(os.getenv("DL_GLOBAL_LIMIT", "8"))
+DL_USER_LIMIT = int(os.getenv("DL_USER_LIMIT", "4"))
+DOWNLOAD_DIR = os.path.abspath(os.getenv("DOWNLOAD_DIR", "downloads"))
+STREAM_QUEUE = int(os.getenv("STREAM_QUEUE", "4"))
+READ_CHUNK = 1 << 20
+
+_seq = itertools.count(1)
+
+def local_path(folder, doc):
+    return os.path.join(folder, f"{next(_seq)}-{os.path.basename(doc.file_name or 'file')}")
+
+def _feed_file(path, feed):
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_CHUNK): feed(chunk)
+
+async def stream_to_file(client, m, path, feed, depth=STREAM_QUEUE):
+    # One task pulls chunks off the network, this one writes and feeds them (in
+    # a thread) through a bounded queue, so network, disk and parsing overlap
+    q = asyncio.Queue(maxsize=depth)
+
+    async def pull():
+        try:
+            async for chunk in client.stream_media(m): await q.put(chunk)
+        except Exception as e:
+            await q.put(e)
+            return
+        await q.put(None)
+
+    def take(f, chunk):
+        f.write(chunk)
+        feed(chunk)
+
+    puller = asyncio.create_task(pull())
+    try:
+        with open(path, 'wb') as f:
+            while (chunk := await q.get()) is not None:
+                if isinstance(chunk, Exception): raise chunk
+                await asyncio.to_thread(take, f, chunk)
+    except BaseException:
+        if os.path.exists(path): os.remove(path)
+        raise
+    finally:
+        if not puller.done():
+            puller.cancel()
+            await asyncio.gather(puller, return_exceptions=True)
+    return path
+
+class DownloadManager:
+    def __init__(self, global_limit=DL_GLOBAL_LIMIT, user_limit=DL_USER_LIMIT, cache=None):
+        self.global_sem = asyncio.Semaphore(global_limit)
+        self.cache = cache
+        self.user_limit = user_limit
+        self.user_sems = {}
+        self.active = {}
+
+    async def _from_cache(self, doc, path):
+        if not self.cache: return None
+        try:
+            return await asyncio.to_thread(self.cache.fetch_input, doc.file_unique_id, path)
+        except (OSError, sqlite3.Error):
+            return None
+
+    async def _to_cache(self, doc, path):
+        if not self.cache or not path: return
+        try:
+            await asyncio.to_thread(self.cache.store_input, doc.file_unique_id, path)
+        except (OSError, sqlite3.Error):
+            pass
+
+    async def _download(self, m, sem, path, client=None, feed=None):
+        async with sem, self.global_sem:
+            t0 = time.monotonic()
+            try:
+                if feed: path = await stream_to_file(client, m, path, feed)
+                else: path = await m.download(file_name=path)
+                # Pyrogram reports a failed download by returning None
+                if not path: raise OSError(f"download failed: {m.document.file_name}")
+            except asyncio.CancelledError:
+                raise
+            except:
+                metrics.DOWNLOADS.inc(status="error")
+                raise
+            metrics.DOWNLOAD_SECONDS.observe(time.monotonic() - t0)
+            metrics.DOWNLOAD_BYTES.observe(os.path.getsize(path))
+            metrics.DOWNLOADS.inc(status="ok")
+        await self._to_cache(m.document, path)
+        return path
+
+    async def _fetch(self, uid, m, client, feed, folder):
+        sem = self.user_sems.setdefault(uid, asyncio.Semaphore(self.user_limit))
+        os.makedirs(folder, exist_ok=True)
+        path = local_path(folder, m.document)
+        if await self._from_cache(m.document, path):
+            metrics.DOWNLOADS.inc(status="cached")
+            if feed: await asyncio.to_thread(_feed_file, path, feed)
+        else: path = await self._download(m, sem, path, client, feed)
+        try:
+            await m.delete()
+        except:
+            pass
+        return path
+
+    def start(self, uid, m, client=None, feed=None, folder=DOWNLOAD_DIR):
+        # feed(chunk) streams the file through client.stream_media (needs client)
+        self.active[uid] = self.active.get(uid, 0) + 1
+        task = asyncio.create_task(self._fetch(uid, m, client, feed if client else None, folder))
+        # A done callback also runs for a task cancelled before its first step
+        task.add_done_callback(lambda t: self._finished(uid))
+        return task
+
+    def _finished(self, uid):
+        self.active[uid] -= 1
+        if not self.active[uid]:
+            del self.active[uid]
+            self.user_sems.pop(uid, None)
+
+async def wait_downloads(tasks):
+    # Only awaits what is still pending; docs that arrive meanwhile are included
+    while True:
+        pending = [t for t in tasks if not t.done()]
+        if not pending: break
+        await asyncio.wait(pending)
+    return [None if t.cancelled() or t.exception() else t.result() for t in tasks]
+
+def discard_downloads(tasks):
+    for t in tasks:
+        if not t.done(): t.cancel()
+        elif not t.cancelled() and not t.exception():
+            if t.result() and os.path.exists(t.result()): os.remove(t.result())
+
+def pending_count(tasks):
+    return sum(1 for t in tasks if not t.done())
@@ -0,0 +1,121 @@
+import os
+import time
+import heapq
+import asyncio
+
+# --- JOB QUEUE ---
+# Processors are submitted here instead of running inline, and at most
+# JOB_WORKERS run at once. Waiting jobs are picked small-first, then
+# round-robin across users (the user served longest ago goes next), then in
+# arrival order. Every waiting job is told its queue position and ETA.
+
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", "2")))
+SMALL_JOB_BYTES = int(os.getenv("SMALL_JOB_BYTES", str(1 << 20)))
+JOB_OVERHEAD = float(os.getenv("JOB_OVERHEAD", "2"))
+JOB_RATE_HINT = float(os.getenv("JOB_RATE_HINT", str(2 << 20)))
+QUEUE_NOTIFY_INTERVAL = float(os.getenv("QUEUE_NOTIFY_INTERVAL", "5"))
+
+class Job:
+    def __init__(self, uid, fn, size, notify, seq):
+        self.uid, self.fn, self.size, self.notify, self.seq = uid, fn, size, notify, seq
+        self.small = size <= SMALL_JOB_BYTES
+        self.task, self.started = None, 0
+        self.pos, self.notified, self.notice = None, 0, None
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self.waiting, self.running, self.notices = [], set(), set()
+        self.served, self.turn, self.seq = {}, 0, 0
+        # Observed conversion+upload speed in bytes/s, for ETAs
+        self.rate = JOB_RATE_HINT
+
+    def submit(self, uid, fn, size=0, notify=None):
+        # fn: zero-argument coroutine function; notify(pos, eta): pos 0 = started/cancelled
+        self.seq += 1
+        job = Job(uid, fn, size, notify, self.seq)
+        self.waiting.append(job)
+        self._dispatch()
+        return job
+
+    def cancel(self, uid):
+        # Drops the user's waiting jobs and cancels running ones (never the caller itself)
+        me = asyncio.current_task()
+        for job in [j for j in self.waiting if j.uid == uid]:
+            self.waiting.remove(job)
+            if job.pos: self._notify(job, 0, 0)
+        for job in self.running:
+            if job.uid == uid and job.task is not me: job.task.cancel()
+        self._announce()
+
+    # --- scheduling ---
+    def _rank(self, job, served):
+        return (not job.small, served.get(job.uid, 0), job.seq)
+
+    def order(self):
+        # Waiting jobs in the order they will be dispatched
+        served, turn, left, out = dict(self.served), self.turn, list(self.waiting), []
+        while left:
+            job = min(left, key=lambda j: self._rank(j, served))
+            left.remove(job)
+            out.append(job)
+            turn += 1
+            served[job.uid] = turn
+        return out
+
+    def _dispatch(self):
+        while self.waiting and len(self.running) < self.workers:
+            job = min(self.waiting, key=lambda j: self._rank(j, self.served))
+            self.waiting.remove(job)
+            self.turn += 1
+            self.served[job.uid] = self.turn
+            self._start(job)
+        self._announce()
+
+    def _start(self, job):
+        job.started = time.monotonic()
+        job.task = asyncio.create_task(job.fn())
+        job.task.add_done_callback(lambda t: self._finished(job))
+        self.running.add(job)
+        if job.pos: self._notify(job, 0, 0)
+
+    def _finished(self, job):
+        self.running.discard(job)
+        if not job.task.cancelled():
+            if job.task.exception(): print(f"❌ Job error: {job.task.exception()}")
+            elif not job.small:
+                took = time.monotonic() - job.started
+                self.rate = 0.7 * self.rate + 0.3 * job.size / max(took - JOB_OVERHEAD, 0.1)
+        self._dispatch()
+
+    # --- feedback ---
+    def estimate(self, job):
+        return JOB_OVERHEAD + job.size / self.rate
+
+    def _announce(self):
+        # Replays the schedule over the worker slots to get each job's start time
+        now = time.monotonic()
+        free = [max(0, self.estimate(j) - (now - j.started)) for j in self.running]
+        free += [0] * (self.workers - len(free))
+        heapq.heapify(free)
+        for pos, job in enumerate(self.order(), 1):
+            eta = heapq.heappop(free)
+            heapq.heappush(free, eta + self.estimate(job))
+            if job.notify and pos != job.pos and now - job.notified >= QUEUE_NOTIFY_INTERVAL:
+                job.pos, job.notified = pos, now
+                self._notify(job, pos, eta)
+
+    def _notify(self, job, pos, eta):
+        # Chained per job so a message is never edited before it was sent
+        prev = job.notice
+
+        async def send():
+            if prev: await asyncio.gather(prev, return_exceptions=True)
+            try:
+                await job.notify(pos, eta)
+            except:
+                pass
+
+        job.notice = asyncio.create_task(send())
+        self.notices.add(job.notice)
+        job.notice.add_done_callback(self.notices.discard)
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import sqlite3
+from jobs import SMALL_JOB_BYTES
+
+# --- SHARED JOB STORE ---
+# With ROLE=bot the Telegram-facing process only collects files and writes
+# each job (processor name, message to answer, args and a session snapshot)
+# here. Any number of ROLE=worker processes claim and run them. SQLite in WAL
+# mode on the shared disk is enough while everything runs on one host;
+# downloads must live on a path all processes can see.
+#
+# Claiming prefers small jobs, and never takes a job for a user who already
+# has one running, so one busy user can't occupy every worker.
+
+JOB_DB = os.getenv("JOB_DB", "jobs.db")
+JOB_POLL = float(os.getenv("JOB_POLL", "1"))
+JOB_STALE = int(os.getenv("JOB_STALE", "120"))
+JOB_KEEP = int(os.getenv("JOB_KEEP", "86400"))
+
+class JobStore:
+    def __init__(self, path=JOB_DB):
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, uid INTEGER, payload TEXT, size INTEGER,
+            status TEXT, worker TEXT, cancel INTEGER DEFAULT 0,
+            created REAL, started REAL, beat REAL, finished REAL)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def _tx(self):
+        # Claims must not interleave between workers: take the write lock up front
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    # --- bot side ---
+    def submit(self, uid, payload, size=0):
+        # -> queue position (1 = next)
+        cur = self.db.execute("INSERT INTO jobs (uid, payload, size, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                              (uid, json.dumps(payload), size, time.time()))
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND id <= ?", (cur.lastrowid,)).fetchone()[0]
+
+    def cancel(self, uid):
+        # Drops the user's queued jobs (-> their payloads) and flags running ones
+        db = self._tx()
+        try:
+            rows = db.execute("SELECT payload FROM jobs WHERE uid = ? AND status = 'queued'", (uid,)).fetchall()
+            db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE uid = ? AND status = 'queued'", (time.time(), uid))
+            db.execute("UPDATE jobs SET cancel = 1 WHERE uid = ? AND status = 'running'", (uid,))
+            db.execute("COMMIT")
+        except:
+            db.execute("ROLLBACK")
+            raise
+        return [json.loads(p) for p, in rows]
+
+    def depth(self):
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def referenced_files(self):
+        # Inputs of jobs that haven't finished yet, for the orphan janitor
+        refs = set()
+        for p, in self.db.execute("SELECT payload FROM jobs WHERE status IN ('queued', 'running')"):
+            sess = json.loads(p)['session']
+            refs.update(os.path.abspath(f) for f in sess.get('files', []) + [sess.get('path')] if f)
+        return refs
+
+    # --- worker side ---
+    def claim(self, worker):
+        # -> (id, uid, payload, size) or None
+        db = self._tx()
+        try:
+            row = db.execute("""SELECT id, uid, payload, size FROM jobs WHERE status = 'queued'
+                AND uid NOT IN (SELECT uid FROM jobs WHERE status = 'running')
+                ORDER BY size > ?, id LIMIT 1""", (SMALL_JOB_BYTES,)).fetchone()
+            if row:
+                now = time.time()
+                db.execute("UPDATE jobs SET status = 'running', worker = ?, started = ?, beat = ? WHERE id = ?",
+                           (worker, now, now, row[0]))
+            db.execute("COMMIT")
+        except:
+            db.execute("ROLLBACK")
+            raise
+        return (row[0], row[1], json.loads(row[2]), row[3]) if row else None
+
+    def heartbeat(self, ids):
+        # Marks our running jobs alive; -> ids the bot asked to cancel
+        if not ids: return []
+        marks = ",".join("?" * len(ids))
+        self.db.execute(f"UPDATE jobs SET beat = ? WHERE id IN ({marks})", (time.time(), *ids))
+        return [i for i, in self.db.execute(f"SELECT id FROM jobs WHERE cancel = 1 AND id IN ({marks})", ids)]
+
+    def finish(self, job_id, status):
+        self.db.execute("UPDATE jobs SET status = ?, finished = ? WHERE id = ?", (status, time.time(), job_id))
+
+    def reap(self):
+        # Jobs of a worker that died are failed, not retried: their inputs may be half consumed.
+        # -> payloads of the jobs failed here, so their users can be told
+        now = time.time()
+        db = self._tx()
+        try:
+            rows = db.execute("SELECT id, payload FROM jobs WHERE status = 'running' AND beat < ?", (now - JOB_STALE,)).fetchall()
+            db.executemany("UPDATE jobs SET status = 'failed', finished = ? WHERE id = ?", [(now, i) for i, _ in rows])
+            db.execute("DELETE FROM jobs WHERE finished < ?", (now - JOB_KEEP,))
+            db.execute("COMMIT")
+        except:
+            db.execute("ROLLBACK")
+            raise
+        return [json.loads(p) for _, p in rows]
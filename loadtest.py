@@ -0,0 +1,333 @@
+import os
+import sys
+import json
+import time
+import types
+import random
+import shutil
+import asyncio
+import argparse
+import itertools
+import tempfile
+from bench import fake_number
+
+# --- LOAD TEST HARNESS ---
+# Drives the real handlers (commands, handle_docs, cb_handler, text_handler)
+# with many concurrent synthetic admins against a local stand-in for Pyrogram,
+# so nothing touches Telegram. Downloads and uploads take simulated time and
+# uploads can raise FloodWait. Reports handler latency, job completion time and
+# how long the event loop was blocked.
+#
+#   python loadtest.py                                   # 10 users, mixed tools
+#   python loadtest.py --users 50 --files 5 --records 50000 --flood-rate 0.1
+#   python loadtest.py --mix t2v,split --out load.json
+#
+# The fake pyrogram package is put in sys.modules before main is imported, so
+# the real one (installed or not) is never used.
+
+# --- FAKE PYROGRAM ---
+class RPCError(Exception): pass
+class BadRequest(RPCError): pass
+class InternalServerError(RPCError): pass
+
+class FloodWait(RPCError):
+    def __init__(self, value=1):
+        super().__init__(f"FloodWait {value}s")
+        self.value = value
+
+class Filter:
+    def __and__(self, other): return self
+    def __or__(self, other): return self
+    def __invert__(self): return self
+
+class Markup:
+    def __init__(self, *args, **kw): self.args, self.kw = args, kw
+
+class InputMediaDocument:
+    def __init__(self, media, **kw): self.media, self.kw = media, kw
+
+class Client:
+    def __init__(self, name, *args, **kw): self.name = name
+
+    def add_handler(self, handler):
+        pass
+
+    async def stream_media(self, m):
+        doc, step = m.document, 1 << 20
+        await asyncio.sleep(SIM.dl_latency)
+        for i in range(0, len(doc.data), step):
+            chunk = doc.data[i:i+step]
+            await asyncio.sleep(len(chunk) / SIM.dl_bps)
+            yield chunk
+
+    async def get_messages(self, chat_id, message_ids):
+        return Message(chat_id, chat_id)
+
+    async def __aenter__(self): return self
+    async def __aexit__(self, *exc): pass
+
+async def idle():
+    await asyncio.Event().wait()
+
+def install_fakes():
+    pyrogram = types.ModuleType("pyrogram")
+    pyrogram.Client, pyrogram.idle = Client, idle
+    pyrogram.filters = types.ModuleType("pyrogram.filters")
+    pyrogram.filters.command = pyrogram.filters.user = lambda *a, **k: Filter()
+    pyrogram.filters.document = pyrogram.filters.text = pyrogram.filters.private = Filter()
+    pyrogram.types = types.ModuleType("pyrogram.types")
+    for name in ("InlineKeyboardMarkup", "InlineKeyboardButton", "CallbackQuery", "Message", "ForceReply"):
+        setattr(pyrogram.types, name, Markup)
+    pyrogram.types.InputMediaDocument = InputMediaDocument
+    pyrogram.handlers = types.ModuleType("pyrogram.handlers")
+    pyrogram.handlers.MessageHandler = pyrogram.handlers.CallbackQueryHandler = lambda *a: None
+    pyrogram.errors = types.ModuleType("pyrogram.errors")
+    for cls in (RPCError, BadRequest, InternalServerError, FloodWait): setattr(pyrogram.errors, cls.__name__, cls)
+    sys.modules.update({"pyrogram": pyrogram, "pyrogram.filters": pyrogram.filters,
+                        "pyrogram.types": pyrogram.types, "pyrogram.handlers": pyrogram.handlers,
+                        "pyrogram.errors": pyrogram.errors})
+
+# --- SIMULATED TELEGRAM ---
+class Sim:
+    # Network model and what the bot sent, shared by all fake objects
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.dl_latency, self.dl_bps = args.dl_latency, args.dl_mbps * 1e6
+        self.ul_latency, self.ul_bps = args.ul_latency, args.ul_mbps * 1e6
+        self.flood_rate, self.flood_wait = args.flood_rate, args.flood_wait
+        self.ids, self.uploads, self.floods, self.sent_bytes = itertools.count(1), 0, 0, 0
+        self.done = {}
+
+    async def upload(self, size):
+        if self.rng.random() < self.flood_rate:
+            self.floods += 1
+            raise FloodWait(self.flood_wait)
+        await asyncio.sleep(self.ul_latency + size / self.ul_bps)
+        self.uploads += 1
+        self.sent_bytes += size
+
+SIM = None
+
+class User:
+    def __init__(self, uid): self.id = uid
+
+class Chat:
+    def __init__(self, cid): self.id = cid
+
+class Document:
+    def __init__(self, name, data):
+        self.file_name, self.data, self.file_size = name, data, len(data)
+        self.file_unique_id = f"lt{next(SIM.ids)}"
+        self.file_id = "f" + self.file_unique_id
+
+class Message:
+    def __init__(self, uid, chat_id, text=None, document=None):
+        self.id, self.from_user, self.chat = next(SIM.ids), User(uid), Chat(chat_id)
+        self.text, self.document = text, document
+        self.command = text[1:].split() if text and text.startswith("/") else None
+
+    def _bot(self, text=None):
+        return Message(0, self.chat.id, text)
+
+    def _status(self, text):
+        # "✅ ... Done" or "❌ ..." ends the job of this chat
+        if text.startswith("❌") or (text.startswith("✅") and "Done" in text):
+            done = SIM.done.get(self.chat.id)
+            if done and not done.done(): done.set_result(text)
+
+    async def reply(self, text, **kw):
+        self._status(text)
+        return self._bot(text)
+
+    async def edit(self, text, **kw):
+        self._status(text)
+        self.text = text
+        return self
+
+    edit_text = edit
+
+    async def delete(self): pass
+
+    async def download(self, file_name=None, **kw):
+        doc = self.document
+        await asyncio.sleep(SIM.dl_latency + doc.file_size / SIM.dl_bps)
+        path = os.path.join(file_name, doc.file_name) if file_name.endswith(os.sep) else file_name
+        with open(path, 'wb') as f: f.write(doc.data)
+        return os.path.abspath(path)
+
+    async def reply_document(self, document, file_name=None, **kw):
+        if hasattr(document, "read"): size = len(document.read())
+        elif isinstance(document, str) and os.path.exists(document): size = os.path.getsize(document)
+        else: size = 0
+        await SIM.upload(size)
+        m = self._bot()
+        m.document = Document(file_name or getattr(document, "name", "file"), b"")
+        return m
+
+    async def reply_media_group(self, media, **kw):
+        sizes = [len(x.media.read()) for x in media]
+        await SIM.upload(sum(sizes))
+        out = []
+        for x in media:
+            m = self._bot()
+            m.document = Document(getattr(x.media, "name", "file"), b"")
+            out.append(m)
+        return out
+
+class CallbackQuery:
+    def __init__(self, uid, data, message):
+        self.from_user, self.data, self.message = User(uid), data, message
+
+    async def answer(self, *args, **kw): pass
+
+# --- SYNTHETIC USERS ---
+def make_txt(rng, n):
+    return "".join(f"{fake_number(rng)}\n" for _ in range(n)).encode()
+
+def make_vcf(rng, n):
+    return "".join(f"BEGIN:VCARD\nVERSION:3.0\nFN:Contact {i}\nTEL;TYPE=CELL:{fake_number(rng)}\nEND:VCARD\n"
+                   for i in range(1, n + 1)).encode()
+
+class Stats:
+    def __init__(self):
+        self.handlers, self.jobs, self.sessions, self.errors = {}, [], [], []
+
+    async def call(self, name, coro):
+        t0 = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.handlers.setdefault(name, []).append(time.perf_counter() - t0)
+
+async def run_user(main, stats, uid, tool, args):
+    rng = random.Random(args.seed + uid)
+    c = main.app
+    bot = Message(0, uid)
+    msg = lambda text=None, doc=None: Message(uid, uid, text, doc)
+    ext = ".vcf" if tool == "v2t" else ".txt"
+    make = make_vcf if ext == ".vcf" else make_txt
+    done = SIM.done[uid] = asyncio.get_running_loop().create_future()
+    t0 = time.perf_counter()
+
+    if tool == "split":
+        await stats.call("command", main.split_start(c, msg("/split_file")))
+        await stats.call("handle_docs", main.handle_docs(c, msg(doc=Document(f"u{uid}{ext}", make(rng, args.records)))))
+        await stats.call("text_handler", main.text_handler(c, msg(str(max(1, args.records // 4)))))
+    else:
+        start = {"t2v": main.t2v_start, "v2t": main.v2t_start, "merge": main.merge_txt_start}[tool]
+        await stats.call("command", start(c, msg("/merge_txt dedup" if tool == "merge" else "/cmd")))
+        for i in range(args.files):
+            await stats.call("handle_docs", main.handle_docs(c, msg(doc=Document(f"u{uid}_{i}{ext}", make(rng, args.records)))))
+            await asyncio.sleep(args.gap)
+        await stats.call("cb_handler", main.cb_handler(c, CallbackQuery(uid, "done_batch", bot)))
+        if tool == "t2v": await stats.call("text_handler", main.text_handler(c, msg("Load")))
+
+    # The last step queues the job; completion is the final ✅/❌ message
+    queued = time.perf_counter()
+    await stats.call("cb_handler", main.cb_handler(c, CallbackQuery(uid, "name_default", bot)))
+    try:
+        result = await asyncio.wait_for(done, args.timeout)
+        if result.startswith("❌"): stats.errors.append((uid, tool, result))
+    except asyncio.TimeoutError:
+        stats.errors.append((uid, tool, "timeout"))
+        return
+    end = time.perf_counter()
+    stats.jobs.append((tool, end - queued))
+    stats.sessions.append(end - t0)
+
+async def watch_loop(interval, lags):
+    # How late each short sleep wakes up = how long something blocked the loop
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - t0 - interval))
+
+# --- REPORTING ---
+def pct(values, q):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def row(label, values):
+    return {"label": label, "n": len(values), "p50_ms": round(pct(values, 0.5) * 1000, 1),
+            "p99_ms": round(pct(values, 0.99) * 1000, 1), "max_ms": round(max(values, default=0) * 1000, 1)}
+
+def report(stats, lags, wall, args):
+    rows = [row(f"handler {name}", v) for name, v in sorted(stats.handlers.items())]
+    rows += [row(f"job {tool}", [s for t, s in stats.jobs if t == tool]) for tool in sorted({t for t, _ in stats.jobs})]
+    rows += [row("job all", [s for _, s in stats.jobs]), row("session end-to-end", stats.sessions), row("loop lag", lags)]
+    for r in rows: print(f"{r['label']:>22}  n={r['n']:<6} p50 {r['p50_ms']:>9.1f}ms  p99 {r['p99_ms']:>9.1f}ms  max {r['max_ms']:>9.1f}ms")
+    blocked = sum(l for l in lags if l > args.block_ms / 1000)
+    print(f"\n⏱ wall {wall:.1f}s, loop blocked {blocked:.2f}s (stalls > {args.block_ms}ms), "
+          f"{SIM.uploads} uploads, {SIM.sent_bytes / 1e6:.1f} MB sent, {SIM.floods} FloodWaits injected, "
+          f"{len(stats.jobs)}/{args.users} jobs done")
+    for uid, tool, err in stats.errors: print(f"❌ user {uid} ({tool}): {err}")
+    return {"args": vars(args), "wall_s": round(wall, 2), "loop_blocked_s": round(blocked, 3),
+            "uploads": SIM.uploads, "floods": SIM.floods, "errors": len(stats.errors), "rows": rows}
+
+async def run(args):
+    import main
+    main.setup()
+    tools = args.mix.split(",")
+    uids = list(range(1000, 1000 + args.users))
+    main.ADMINS.update(uids)
+    stats, lags = Stats(), []
+    watcher = asyncio.create_task(watch_loop(args.lag_interval, lags))
+    t0 = time.perf_counter()
+
+    async def user(i, uid):
+        await asyncio.sleep(args.ramp * i / max(1, args.users))
+        await run_user(main, stats, uid, tools[i % len(tools)], args)
+
+    await asyncio.gather(*(user(i, uid) for i, uid in enumerate(uids)))
+    wall = time.perf_counter() - t0
+    watcher.cancel()
+    return report(stats, lags, wall, args)
+
+def main():
+    global SIM
+    ap = argparse.ArgumentParser(description="Load-test the bot handlers against a fake Telegram")
+    ap.add_argument("--users", type=int, default=10, help="concurrent synthetic admins")
+    ap.add_argument("--mix", default="t2v,v2t,merge,split", help="tools cycled over users: t2v, v2t, merge, split")
+    ap.add_argument("--files", type=int, default=3, help="files per user (split always sends one)")
+    ap.add_argument("--records", type=int, default=10_000, help="contacts per file")
+    ap.add_argument("--gap", type=float, default=0.05, help="seconds between one user's uploads")
+    ap.add_argument("--ramp", type=float, default=1.0, help="seconds over which users start")
+    ap.add_argument("--dl-latency", type=float, default=0.2, help="seconds before a download starts")
+    ap.add_argument("--dl-mbps", type=float, default=20, help="download speed, MB/s")
+    ap.add_argument("--ul-latency", type=float, default=0.3, help="seconds per upload call")
+    ap.add_argument("--ul-mbps", type=float, default=10, help="upload speed, MB/s")
+    ap.add_argument("--flood-rate", type=float, default=0.05, help="chance an upload raises FloodWait")
+    ap.add_argument("--flood-wait", type=int, default=1, help="seconds each FloodWait asks for")
+    ap.add_argument("--timeout", type=float, default=600, help="seconds a job may take")
+    ap.add_argument("--lag-interval", type=float, default=0.01, help="loop lag probe interval")
+    ap.add_argument("--block-ms", type=float, default=50, help="lag counted as blocking above this")
+    ap.add_argument("--seed", type=int, default=1337)
+    ap.add_argument("--workdir", help="scratch folder (default: a temp dir, removed afterwards)")
+    ap.add_argument("--out", help="write the results as JSON")
+    args = ap.parse_args()
+
+    SIM = Sim(args)
+    if args.out: args.out = os.path.abspath(args.out)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="vcfbot_load_")
+    os.makedirs(workdir, exist_ok=True)
+    # main reads its config at import: keep everything inside the scratch folder,
+    # single process, no persistence and no result cache (every run is real work)
+    os.chdir(workdir)
+    os.environ.update(ROLE="all", SESSION_DB="", METRICS_PORT="0", CACHE_BYTES="0", CACHE_OUTPUTS="0",
+                      DOWNLOAD_DIR=os.path.join(workdir, "downloads"), CACHE_DIR=os.path.join(workdir, "cache"))
+    os.environ.setdefault("BOT_TOKEN", "loadtest")
+    os.makedirs(os.environ["DOWNLOAD_DIR"], exist_ok=True)
+    install_fakes()
+    from workers import shutdown_pool
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        shutdown_pool()
+        if not args.workdir: shutil.rmtree(workdir, ignore_errors=True)
+    if args.out:
+        with open(args.out, 'w') as f: json.dump(result, f, indent=2)
+        print(f"📝 Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
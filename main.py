@@ -1,14 +1,38 @@
 import os
+import time
 import asyncio
 import re
-from pyrogram import Client, filters
+import socket
+import sqlite3
+import functools
+import convert
+import metrics
+import progress
+from pyrogram import Client, filters, idle
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, Message, ForceReply
+from pyrogram.errors import BadRequest
+from pyrogram.handlers import MessageHandler, CallbackQueryHandler
+from workers import run_cpu, shutdown_pool
+from downloads import DownloadManager, wait_downloads, discard_downloads, pending_count
+from scratch import Scratch, QuotaExceeded, SCRATCH_ROOT
+from pipeline import run_pipeline
+from sender import sender, MEDIA_GROUP_SIZE
+from sink import Sink, Output
+from bundle import Bundle
+from session import SessionStore, SESSION_DB, TRANSIENT_KEYS
+from jobs import JobQueue
+from jobstore import JobStore, JOB_POLL
+from cache import FileCache
+from progress import fmt_eta
 
 # --- CONFIGURATION (Environment Variables) ---
 API_ID = int(os.getenv("API_ID", "0")) 
 API_HASH = os.getenv("API_HASH", "")
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 OWNER_ID = int(os.getenv("OWNER_ID", "0"))
+# all: one process does everything; bot: collects files and queues jobs in the
+# shared JOB_DB; worker: runs those jobs (start as many as needed)
+ROLE = os.getenv("ROLE", "all")
 
 # --- ADMIN SYSTEM ---
 ADMIN_FILE = "admins.txt"
@@ -37,14 +61,32 @@ def remove_admin_from_file(user_id):
 ADMINS = get_admins()
 
 # --- APP SETUP ---
-if not BOT_TOKEN:
-    print("Error: BOT_TOKEN variable not found!")
-    exit()
+# The pool's spawned workers re-run this file as __mp_main__, so importing it
+# must not touch Telegram, the session DB or scratch files: all of that lives
+# in setup(), which only the __main__ process calls. Handlers are collected
+# here and added to the client there.
+app = user_data = file_cache = downloads = scratch = jobs = job_store = None
+background = set()
+HANDLERS = []
 
-app = Client("fast_contact_bot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+def on_message(flt):
+    def register(fn):
+        HANDLERS.append(MessageHandler(fn, flt))
+        return fn
+    return register
+
+def on_callback_query():
+    def register(fn):
+        HANDLERS.append(CallbackQueryHandler(fn))
+        return fn
+    return register
 
 # --- STATE MANAGEMENT ---
-user_data = {}
+def drop_session_files(uid, sess):
+    discard_downloads(sess.get('downloads', []))
+    if sess.get('dir'): return scratch.remove(sess['dir'])
+    for f in sess.get('files', []) + [sess.get('path')]:
+        if f and os.path.exists(f): os.remove(f)
 
 # States
 S_NONE = 0
@@ -76,31 +118,325 @@ S_MERGE_VCF_CUSTOM = 25
 S_COLLECTING_MERGE_TXT = 26
 S_MERGE_TXT_MODE = 27
 S_MERGE_TXT_CUSTOM = 28
+S_QUEUED = 29
+S_COLLECTING_PIPELINE = 30
+S_PIPE_NAME = 31
+S_PIPE_COUNT = 32
+S_PIPE_MODE = 33
+S_PIPE_CUSTOM = 34
+S_COLLECTING_NAVY = 35
+S_NAVY_MODE = 36
+S_NAVY_CUSTOM = 37
+
+COLLECTING_STATES = [S_COLLECTING_T2V, S_COLLECTING_V2T, S_COLLECTING_RENAME, S_COLLECTING_REN_CTC, S_COLLECTING_MERGE_VCF, S_COLLECTING_MERGE_TXT, S_COLLECTING_PIPELINE, S_COLLECTING_NAVY]
+
+def setup():
+    global app, user_data, file_cache, downloads, scratch, jobs, job_store
+    if not BOT_TOKEN:
+        print("Error: BOT_TOKEN variable not found!")
+        exit()
+
+    if ROLE == "worker":
+        # Workers only send: no updates, and no session file for several of them to fight over
+        app = Client("fast_contact_worker", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN, in_memory=True, no_updates=True)
+    else:
+        app = Client("fast_contact_bot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+    for handler in HANDLERS: app.add_handler(handler)
+
+    # A worker's sessions are job snapshots, never the bot's persisted ones
+    user_data = SessionStore(on_evict=drop_session_files, db_path="" if ROLE == "worker" else SESSION_DB)
+    file_cache = FileCache()
+    downloads = DownloadManager(cache=file_cache)
+    scratch = Scratch()
+    jobs = JobQueue()
+    job_store = JobStore() if ROLE in ("bot", "worker") else None
+
+    metrics.gauge("vcfbot_queue_depth", "Queued Jobs", lambda: len(jobs.waiting))
+    metrics.gauge("vcfbot_jobs_running", "Running Jobs", lambda: len(jobs.running))
+    metrics.gauge("vcfbot_active_sessions", "Active Sessions", lambda: len(user_data))
+    metrics.gauge("vcfbot_downloads_active", "Active Downloads", lambda: sum(downloads.active.values()))
+    if job_store: metrics.gauge("vcfbot_shared_queue_depth", "Shared Queue", job_store.depth)
+
+    # Sessions restored from SESSION_DB lost their live download tasks
+    for uid, sess in list(user_data.data.items()):
+        sess['downloads'] = []
+        if sess.get('dir'): scratch.adopt(uid, sess['dir'])
+        if sess.get('state') in COLLECTING_STATES:
+            for key in ('original_names', 'exts', 'uids'):
+                if key in sess: sess[key] = []
+
+    # Queued jobs don't survive a restart
+    for uid in list(user_data):
+        if user_data[uid].get('state') == S_QUEUED:
+            sess = user_data[uid]
+            del user_data[uid]
+            drop_session_files(uid, sess)
 
 # --- HELPER FUNCTIONS ---
 def is_admin(user_id):
     return user_id in ADMINS
 
 async def reset_user(user_id):
+    # /reset only: cancels every job of the user
+    jobs.cancel(user_id)
+    user_data.pinned.pop(user_id, None)
     if user_id in user_data:
-        if 'files' in user_data[user_id]:
-            for f in user_data[user_id]['files']:
-                if os.path.exists(f): os.remove(f)
+        sess = user_data[user_id]
         del user_data[user_id]
+        drop_session_files(user_id, sess)
+
+def finish_job(uid, sess):
+    # End of a job: drops its own session and files only. A newer session the
+    # user started meanwhile, and any other job of theirs, are left alone.
+    if user_data.get(uid) is sess: del user_data[uid]
+    drop_session_files(uid, sess)
+
+def holds_session(fn):
+    # Processors pin the session so TTL eviction can't pull files from under them
+    @functools.wraps(fn)
+    async def run(c, m, uid, *args):
+        sess = user_data[uid]
+        user_data.pin(uid)
+        try:
+            return await fn(c, m, uid, *args)
+        finally:
+            user_data.unpin(uid)
+            finish_job(uid, sess)
+    return run
+
+class QueueNotice:
+    # One "queued" message per job, edited as it moves up and deleted once it starts
+    def __init__(self, m):
+        self.m, self.msg = m, None
+
+    async def __call__(self, pos, eta):
+        if not pos:
+            if self.msg: await self.msg.delete()
+            return
+        text = f"⏳ **Queued.**\n\n**Position:** `{pos}`\n**ETA:** `~{fmt_eta(eta)}`"
+        if self.msg: await self.msg.edit(text)
+        else: self.msg = await self.m.reply(text)
+
+def spawn(coro):
+    task = asyncio.create_task(coro)
+    background.add(task)
+    task.add_done_callback(background.discard)
+
+def session_bytes(sess):
+    paths = sess.get('files', []) + [sess.get('path')]
+    return sum(os.path.getsize(p) for p in paths if p and os.path.exists(p))
+
+def enqueue(fn, c, m, uid, *args):
+    # Processors go through the shared job queue instead of running inline;
+    # the session stays pinned while it waits
+    if job_store: return hand_off(fn, m, uid, args)
+    sess = user_data[uid]
+    sess['state'] = S_QUEUED
+    user_data.pin(uid)
+    size, submitted = session_bytes(sess), time.monotonic()
+
+    async def run():
+        try:
+            if user_data.get(uid) is not sess:
+                # A new command replaced the session while this job waited
+                drop_session_files(uid, sess)
+                return await m.reply("❌ **Queued job dropped:** you started another command.")
+            with metrics.job(fn.__name__.removeprefix("process_"), size, time.monotonic() - submitted):
+                async with progress.job(): await fn(c, m, uid, *args)
+        finally:
+            user_data.unpin(uid)
+
+    jobs.submit(uid, run, size, QueueNotice(m))
+
+def hand_off(fn, m, uid, args):
+    # ROLE=bot: the job and a snapshot of its session go to the shared store.
+    # The session is released here without touching its files; a worker owns them now.
+    sess = user_data[uid]
+    sess['state'] = S_QUEUED
+    payload = {'fn': fn.__name__, 'chat_id': m.chat.id, 'message_id': m.id, 'args': list(args), 'submitted': time.time(),
+               'session': {k: v for k, v in sess.items() if k not in TRANSIENT_KEYS}}
+    pos = job_store.submit(uid, payload, session_bytes(sess))
+    del user_data[uid]
+    scratch.release(sess.get('dir'))
+    spawn(m.reply(f"⏳ **Queued.**\n\n**Position:** `{pos}`"))
+
+def reserve_scratch(uid, m):
+    # -> the session's scratch dir, with room reserved for m's document
+    sess = user_data[uid]
+    if not sess.get('dir'): sess['dir'] = scratch.create(uid)
+    scratch.reserve(sess['dir'], m.document.file_size or 0)
+    return sess['dir']
+
+async def collect_files(uid):
+    # Waits for pending downloads and drops any that failed, keeping names aligned
+    sess = user_data[uid]
+    paths = await wait_downloads(sess['downloads'])
+    keep = [i for i, p in enumerate(paths) if p]
+    sess['files'] = [paths[i] for i in keep]
+    for key in ('original_names', 'exts', 'uids'):
+        if key in sess: sess[key] = [sess[key][i] for i in keep]
+    return len(paths) - len(keep)
+
+def out_names(uid, custom, ext):
+    sess = user_data[uid]
+    if custom: return [f"{sess.get('custom_name')} {i+1}{ext}" for i in range(len(sess['files']))]
+    return [f"{base}{ext}" for base in sess['original_names']]
+
+async def render(name, fn, *args):
+    # Runs a convert core in the pool, rendering into an in-memory sink
+    with metrics.phase("convert"): return await run_cpu(fn, *args, Sink(name))
+
+def discard_output(out):
+    out.discard()
+
+class Uploader:
+    # Upload stage: batches outputs into media groups of MEDIA_GROUP_SIZE
+    def __init__(self, m, job, group=MEDIA_GROUP_SIZE, count_files=True):
+        self.m, self.job, self.group, self.count_files = m, job, group, count_files
+        self.batch, self.file_ids = [], []
+
+    async def put(self, i, out):
+        self.batch.append(out)
+        if len(self.batch) >= self.group: await self.flush()
+
+    async def flush(self):
+        batch, self.batch = self.batch, []
+        if not batch: return
+        metrics.output(*batch)
+        try:
+            with metrics.phase("upload"): msgs = await sender.send_documents(self.m, batch, self.job)
+            self.file_ids += sent_file_ids(msgs)
+            progress.report(uploaded=sum(out.size for out in batch), files=len(batch) if self.count_files else 0)
+        finally:
+            for out in batch: out.discard()
+
+    def discard(self):
+        for out in self.batch: out.discard()
+        self.batch = []
+
+def bundle_name(uid):
+    sess = user_data[uid]
+    if not sess.get('bundle'): return None
+    bases = sess.get('original_names') or [sess.get('original_name')]
+    return f"{bases[0]}.zip" if len(bases) == 1 else "Bundle_Output.zip"
+
+async def deliver(m, job, items, conv, bundle=None):
+    # Pipelined convert -> upload; with a bundle name every part goes into one ZIP.
+    # Returns the file_ids of the uploaded documents.
+    # Files count as done once uploaded, or once zipped for a bundle
+    up = Uploader(m, job, count_files=not bundle)
+    progress.expect(len(items))
+
+    async def counted(i, item):
+        out = await conv(i, item)
+        progress.report(records=out.count)
+        return out
+
+    async def zipped(i, out):
+        await zf.put(i, out)
+        progress.report(files=1)
+
+    if not bundle:
+        try:
+            await run_pipeline(items, counted, up.put, discard_output)
+            await up.flush()
+            return up.file_ids
+        finally:
+            up.discard()
+    zf = Bundle(bundle)
+    try:
+        await run_pipeline(items, counted, zipped, discard_output)
+    except:
+        zf.abort()
+        raise
+    await up.put(0, zf.close())
+    await up.flush()
+    return up.file_ids
+
+async def convert_and_send(m, job, files, names, fn, *args, bundle=None):
+    # Pipelined: file i+1 converts in the pool while file i uploads
+    async def conv(i, path):
+        out = await render(names[i], fn, path, *args)
+        os.remove(path)
+        return out
+
+    return await deliver(m, job, files, conv, bundle)
+
+def sent_file_ids(msgs):
+    return [getattr(getattr(x, 'document', None), 'file_id', None) for x in msgs]
+
+def output_key(uid, tool, *params):
+    # None when a source has no unique id (e.g. a session restored from SESSION_DB)
+    ids = user_data[uid].get('uids')
+    if not ids or None in ids: return None
+    return file_cache.key(tool, ids, *params)
+
+async def send_cached(m, job, key):
+    # Answers an identical earlier run by file_id; its meta dict, or None on a miss
+    try:
+        hit = file_cache.get_outputs(key)
+    except sqlite3.Error as e:
+        print(f"🗄 Cache error: {e}")
+        return None
+    if not hit: return None
+    file_ids, meta = hit
+    try:
+        with metrics.phase("upload"): await sender.send_cached(m, file_ids, job)
+    except BadRequest:
+        try:
+            file_cache.forget_outputs(key)
+        except sqlite3.Error:
+            pass
+        return None
+    return meta
+
+def cache_outputs(key, file_ids, meta=None):
+    # The job already succeeded: a cache write that fails is only a miss next time
+    try:
+        file_cache.put_outputs(key, file_ids, meta)
+    except sqlite3.Error as e:
+        print(f"🗄 Cache error: {e}")
 
 def clean_contact_name(name):
     return re.sub(r'\s*\d+$', '', name).strip()
 
+def pipeline_check(uid):
+    # Error text when the collected files can't go through the chosen steps
+    sess = user_data[uid]
+    kinds = {".vcf" if e.lower() == ".vcf" else ".txt" for e in sess['exts']}
+    if len(kinds) > 1: return "Send only TXT or only VCF files, not both."
+    sess['ext'] = kinds.pop()
+    if "t2v" in sess['steps'] and sess['ext'] == ".vcf": return "t2v needs TXT files."
+    if "ren_ctc" in sess['steps'] and "t2v" not in sess['steps'] and sess['ext'] == ".txt": return "ren_ctc needs VCF files (or t2v before it)."
+    return None
+
+async def pipeline_prompt(reply, uid):
+    # Asks for the next missing parameter, then for the output name mode
+    sess, steps = user_data[uid], user_data[uid]['steps']
+    if ("t2v" in steps or "ren_ctc" in steps) and 'c_name' not in sess:
+        sess['state'] = S_PIPE_NAME
+        return await reply("👤 **Enter Contact Name Base:**\n(Contacts will be Name 1, Name 2...)")
+    if "split" in steps and 'split_count' not in sess:
+        sess['state'] = S_PIPE_COUNT
+        return await reply("🔢 **Enter how many per file?**")
+    sess['state'] = S_PIPE_MODE
+    await reply("📝 **Select Output File Name Mode:**", reply_markup=PARTS_MODE_BTN if "split" in steps else NAME_MODE_BTN)
+
 # --- KEYBOARDS ---
 DONE_BTN = InlineKeyboardMarkup([[InlineKeyboardButton("✅ Upload Done / Next", callback_data="done_batch")]])
 NAME_MODE_BTN = InlineKeyboardMarkup([
     [InlineKeyboardButton("📂 Default Name", callback_data="name_default")],
     [InlineKeyboardButton("✏️ Custom Name", callback_data="name_custom")]
 ])
+PARTS_MODE_BTN = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📂 Default Name", callback_data="name_default")],
+    [InlineKeyboardButton("✏️ Custom Name", callback_data="name_custom")],
+    [InlineKeyboardButton("📦 Single ZIP Bundle", callback_data="name_bundle")]
+])
 
 # --- COMMANDS ---
 
-@app.on_message(filters.command("start"))
+@on_message(filters.command("start"))
 async def start(client, message):
     if not is_admin(message.from_user.id): return
     await message.reply(
@@ -113,18 +449,22 @@ async def start(client, message):
         "➤ **/rename_ctc** - Rename Contact Name\n"
         "➤ **/merge_vcf** - Merge Multiple VCFs\n"
         "➤ **/merge_txt** - Merge Multiple TXTs\n"
+        "     _(add `dedup` to drop repeated numbers)_\n"
         "➤ **/split_file** - Split Mem Per File\n"
+        "➤ **/pipeline** - Chain Tools in One Job\n"
         "➤ **/admin_navy_file** - Admin Navy File\n"
         "➤ **/reset** - Cancel Process"
     )
 
-@app.on_message(filters.command("reset"))
+@on_message(filters.command("reset"))
 async def reset(client, message):
     await reset_user(message.from_user.id)
+    if job_store:
+        for payload in job_store.cancel(message.from_user.id): drop_session_files(message.from_user.id, payload['session'])
     await message.reply("🔄 **Process Reset Successfully.**")
 
 # --- ADMIN COMMANDS ---
-@app.on_message(filters.command("addadmin") & filters.user(OWNER_ID))
+@on_message(filters.command("addadmin") & filters.user(OWNER_ID))
 async def add_adm(c, m):
     if len(m.command) > 1:
         try:
@@ -134,7 +474,7 @@ async def add_adm(c, m):
             await m.reply(f"✅ **User {uid} added as Admin.**")
         except: pass
 
-@app.on_message(filters.command("deladmin") & filters.user(OWNER_ID))
+@on_message(filters.command("deladmin") & filters.user(OWNER_ID))
 async def del_adm(c, m):
     if len(m.command) > 1:
         try:
@@ -145,110 +485,137 @@ async def del_adm(c, m):
                 await m.reply(f"🗑️ **User {uid} removed from Admin.**")
         except: pass
 
+@on_message(filters.command("stats") & filters.user(OWNER_ID))
+async def stats(c, m):
+    await m.reply(metrics.summary())
+
 # --- HANDLERS ---
 
-@app.on_message(filters.command("txt_to_vcf"))
+@on_message(filters.command("txt_to_vcf"))
 async def t2v_start(c, m):
     if not is_admin(m.from_user.id): return
     uid = m.from_user.id
-    user_data[uid] = {'state': S_COLLECTING_T2V, 'files': [], 'original_names': []}
+    user_data[uid] = {'state': S_COLLECTING_T2V, 'files': [], 'downloads': [], 'uids': [], 'original_names': []}
     await m.reply("📂 **Send Text Files.**\nAuto-delete enabled. Click Done when finished.", reply_markup=DONE_BTN)
 
-@app.on_message(filters.command("rename_ctc"))
+@on_message(filters.command("rename_ctc"))
 async def ren_ctc_start(c, m):
     if not is_admin(m.from_user.id): return
     uid = m.from_user.id
-    user_data[uid] = {'state': S_COLLECTING_REN_CTC, 'files': [], 'original_names': []}
+    user_data[uid] = {'state': S_COLLECTING_REN_CTC, 'files': [], 'downloads': [], 'uids': [], 'original_names': []}
     await m.reply("📂 **Send VCF Files to Rename Contacts.**\n(Sequence: Name 1, Name 2...)\nClick Done when finished.", reply_markup=DONE_BTN)
 
-@app.on_message(filters.command("vcf_to_txt"))
+@on_message(filters.command("vcf_to_txt"))
 async def v2t_start(c, m):
     if not is_admin(m.from_user.id): return
     uid = m.from_user.id
-    user_data[uid] = {'state': S_COLLECTING_V2T, 'files': [], 'original_names': []}
+    user_data[uid] = {'state': S_COLLECTING_V2T, 'files': [], 'downloads': [], 'uids': [], 'original_names': []}
     await m.reply("📂 **Send VCF Files.**\nClick Done when finished.", reply_markup=DONE_BTN)
 
-@app.on_message(filters.command("rename_file"))
+@on_message(filters.command("rename_file"))
 async def ren_start(c, m):
     if not is_admin(m.from_user.id): return
     uid = m.from_user.id
-    user_data[uid] = {'state': S_COLLECTING_RENAME, 'files': [], 'exts': [], 'original_names': []}
+    user_data[uid] = {'state': S_COLLECTING_RENAME, 'files': [], 'downloads': [], 'uids': [], 'exts': [], 'original_names': []}
     await m.reply("📂 **Send Files to Rename.**\nClick Done when finished.", reply_markup=DONE_BTN)
 
-@app.on_message(filters.command("merge_vcf"))
+@on_message(filters.command("merge_vcf"))
 async def merge_vcf_start(c, m):
     if not is_admin(m.from_user.id): return
     uid = m.from_user.id
-    user_data[uid] = {'state': S_COLLECTING_MERGE_VCF, 'files': []}
-    await m.reply("📂 **Send VCF Files to Merge.**\nClick Done when finished.", reply_markup=DONE_BTN)
+    dedup = "dedup" in m.command[1:]
+    user_data[uid] = {'state': S_COLLECTING_MERGE_VCF, 'files': [], 'downloads': [], 'uids': [], 'dedup': dedup}
+    await m.reply(f"📂 **Send VCF Files to Merge.**{' (Duplicates removed)' if dedup else ''}\nClick Done when finished.", reply_markup=DONE_BTN)
 
-@app.on_message(filters.command("merge_txt"))
+@on_message(filters.command("merge_txt"))
 async def merge_txt_start(c, m):
     if not is_admin(m.from_user.id): return
     uid = m.from_user.id
-    user_data[uid] = {'state': S_COLLECTING_MERGE_TXT, 'files': []}
-    await m.reply("📂 **Send Text Files to Merge.**\nClick Done when finished.", reply_markup=DONE_BTN)
+    dedup = "dedup" in m.command[1:]
+    user_data[uid] = {'state': S_COLLECTING_MERGE_TXT, 'files': [], 'downloads': [], 'uids': [], 'dedup': dedup}
+    await m.reply(f"📂 **Send Text Files to Merge.**{' (Duplicates removed)' if dedup else ''}\nClick Done when finished.", reply_markup=DONE_BTN)
 
-@app.on_message(filters.command("msg_to_txt"))
+@on_message(filters.command("msg_to_txt"))
 async def m2t_start(c, m):
     if not is_admin(m.from_user.id): return
     user_data[m.from_user.id] = {'state': S_MSG_INPUT}
     await m.reply("📝 **Type your message content below:**", reply_markup=ForceReply(True))
 
-@app.on_message(filters.command("split_file"))
+@on_message(filters.command("split_file"))
 async def split_start(c, m):
     if not is_admin(m.from_user.id): return
     user_data[m.from_user.id] = {'state': S_SPLIT_FILE}
     await m.reply("✂️ **Send the File you want to split:**")
 
-@app.on_message(filters.command("admin_navy_file"))
+PIPELINE_HELP = (
+    "🔗 **Pipeline:** chain tools into one job, nothing is sent back in between.\n\n"
+    "**Usage:** `/pipeline merge t2v ren_ctc split`\n"
+    "Pick any of `merge`, `t2v`, `ren_ctc`, `split` (they always run in that order) "
+    "and add `dedup` to drop repeated numbers. Several files are always merged first."
+)
+
+@on_message(filters.command("pipeline"))
+async def pipeline_start(c, m):
+    if not is_admin(m.from_user.id): return
+    uid = m.from_user.id
+    args = m.command[1:]
+    steps = [s for s in convert.PIPELINE_STEPS if s in args]
+    if "dedup" in args and "merge" not in steps: steps.insert(0, "merge")
+    if not steps: return await m.reply(PIPELINE_HELP)
+    user_data[uid] = {'state': S_COLLECTING_PIPELINE, 'files': [], 'downloads': [], 'uids': [], 'exts': [], 'original_names': [],
+                      'steps': steps, 'dedup': "dedup" in args}
+    await m.reply(f"🔗 **Pipeline:** `{' → '.join(steps)}`\n\n📂 **Send Files.**\nClick Done when finished.", reply_markup=DONE_BTN)
+
+@on_message(filters.command("admin_navy_file"))
 async def navy_start(c, m):
     if not is_admin(m.from_user.id): return
     user_data[m.from_user.id] = {'state': S_NAVY_TEXT}
-    await m.reply("📝 **Send Data in Admin/Navy Format:**", reply_markup=ForceReply(True))
+    await m.reply("📝 **Send Data in Admin/Navy Format:**\n(or upload TXT files in that format)", reply_markup=ForceReply(True))
 
 # --- FILE COLLECTOR ---
-@app.on_message(filters.document)
+@on_message(filters.document)
 async def handle_docs(c, m):
     uid = m.from_user.id
     if uid not in user_data: return
     st = user_data[uid].get('state')
+    if st == S_NAVY_TEXT:
+        # A file instead of pasted text: switch to batch mode
+        st = S_COLLECTING_NAVY
+        user_data[uid].update({'state': st, 'files': [], 'downloads': [], 'uids': [], 'original_names': []})
+        await m.reply("📂 **Navy Files Mode.**\nSend more TXT files, click Done when finished.", reply_markup=DONE_BTN)
+    if st not in COLLECTING_STATES + [S_SPLIT_FILE]: return
+    try:
+        folder = reserve_scratch(uid, m)
+    except QuotaExceeded as e:
+        return await m.reply(f"❌ **{e}**")
 
-    if st in [S_COLLECTING_T2V, S_COLLECTING_V2T, S_COLLECTING_RENAME, S_COLLECTING_REN_CTC]:
-        path = await m.download()
-        user_data[uid]['files'].append(path)
+    if st in [S_COLLECTING_T2V, S_COLLECTING_V2T, S_COLLECTING_RENAME, S_COLLECTING_REN_CTC, S_COLLECTING_PIPELINE, S_COLLECTING_NAVY]:
+        user_data[uid]['downloads'].append(downloads.start(uid, m, folder=folder))
+        user_data[uid]['uids'].append(m.document.file_unique_id)
         base, ext = os.path.splitext(m.document.file_name)
         user_data[uid]['original_names'].append(base)
-        if st == S_COLLECTING_RENAME: user_data[uid]['exts'].append(ext)
-        try:
-            await m.delete()
-        except:
-            pass
+        if st in [S_COLLECTING_RENAME, S_COLLECTING_PIPELINE]: user_data[uid]['exts'].append(ext)
 
     elif st in [S_COLLECTING_MERGE_VCF, S_COLLECTING_MERGE_TXT]:
-        path = await m.download()
-        user_data[uid]['files'].append(path)
-        try:
-            await m.delete()
-        except:
-            pass
+        user_data[uid]['downloads'].append(downloads.start(uid, m, folder=folder))
+        user_data[uid]['uids'].append(m.document.file_unique_id)
 
     elif st == S_SPLIT_FILE:
         msg = await m.reply("🔄 **Analyzing File...**")
-        path = await m.download()
+        sess = user_data[uid]
         base, ext = os.path.splitext(m.document.file_name)
-        try:
-            await m.delete()
-        except:
-            pass
-        
-        is_vcf = path.endswith(".vcf")
-        count = 0
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
-            count = content.count("BEGIN:VCARD") if is_vcf else len(content.splitlines())
+        is_vcf = ext == ".vcf"
+        # Records are indexed chunk by chunk while the file streams in
+        indexer = convert.RecordIndexer(is_vcf)
+        sess['downloads'], sess['uids'] = [downloads.start(uid, m, c, indexer.feed, folder)], [m.document.file_unique_id]
+        path = (await wait_downloads(sess['downloads']))[0]
+        if user_data.get(uid) is not sess: return
+        if not path: return await msg.edit("❌ **Download failed. Send the file again.**")
+
+        index = indexer.finish()
+        count = len(index)
         
-        user_data[uid].update({'state': S_SPLIT_COUNT, 'path': path, 'is_vcf': is_vcf, 'total_items': count, 'original_name': base})
+        user_data[uid].update({'state': S_SPLIT_COUNT, 'path': path, 'is_vcf': is_vcf, 'index': index, 'total_items': count, 'original_name': base})
         try:
             await msg.delete() 
         except:
@@ -256,7 +623,7 @@ async def handle_docs(c, m):
         await m.reply(f"📊 **Analysis Complete.**\n\n**Total Numbers:** `{count}`\n\n🔢 **Enter how many per file?**")
 
 # --- CALLBACKS ---
-@app.on_callback_query()
+@on_callback_query()
 async def cb_handler(c, q):
     uid = q.from_user.id
     if uid not in user_data: return await q.answer("Session expired.")
@@ -264,15 +631,21 @@ async def cb_handler(c, q):
     data = q.data
 
     if data == "done_batch":
-        if st in [S_COLLECTING_T2V, S_COLLECTING_V2T, S_COLLECTING_RENAME, S_COLLECTING_REN_CTC, S_COLLECTING_MERGE_VCF, S_COLLECTING_MERGE_TXT]:
-             if not user_data[uid]['files']: return await q.answer("❌ No files!", show_alert=True)
+        if st in COLLECTING_STATES:
+            sess, tasks = user_data[uid], user_data[uid]['downloads']
+            if not tasks: return await q.answer("❌ No files!", show_alert=True)
+            if pending_count(tasks): await q.answer(f"⏳ Finishing {pending_count(tasks)} downloads...")
+            failed = await collect_files(uid)
+            if user_data.get(uid) is not sess: return
+            if failed: await q.message.reply(f"⚠️ **{failed} file(s) failed to download and were skipped.**")
+            if not user_data[uid]['files']: return await q.message.edit("❌ **No files could be downloaded.**")
 
         if st == S_COLLECTING_T2V:
             user_data[uid]['state'] = S_T2V_CONTACT_NAME
             await q.message.edit(f"✅ **Files Received.**\n\n👤 **Enter Contact Name Base:**\n(e.g., if you type 'Flame', contacts will be Flame 1, Flame 2...)")
         elif st == S_COLLECTING_V2T:
             user_data[uid]['state'] = S_V2T_MODE
-            await q.message.edit("📝 **Select Output File Name Mode:**", reply_markup=NAME_MODE_BTN)
+            await q.message.edit("📝 **Select Output File Name Mode:**", reply_markup=PARTS_MODE_BTN)
         elif st == S_COLLECTING_RENAME:
             user_data[uid]['state'] = S_RENAME_MODE
             await q.message.edit("📝 **Select Renaming Mode:**", reply_markup=NAME_MODE_BTN)
@@ -285,15 +658,35 @@ async def cb_handler(c, q):
         elif st == S_COLLECTING_MERGE_TXT:
             user_data[uid]['state'] = S_MERGE_TXT_MODE
             await q.message.edit("📝 **Select Merged File Name Mode:**", reply_markup=NAME_MODE_BTN)
+        elif st == S_COLLECTING_PIPELINE:
+            error = pipeline_check(uid)
+            if error:
+                finish_job(uid, user_data[uid])
+                return await q.message.edit(f"❌ **{error}**")
+            await pipeline_prompt(q.message.edit, uid)
+        elif st == S_COLLECTING_NAVY:
+            user_data[uid]['state'] = S_NAVY_MODE
+            await q.message.edit("📝 **Select Output File Name Mode:**", reply_markup=PARTS_MODE_BTN)
 
     elif data == "name_default":
-        if st == S_T2V_FILE_MODE: await process_t2v(c, q.message, uid, False)
-        elif st == S_V2T_MODE:    await process_v2t(c, q.message, uid, False)
-        elif st == S_RENAME_MODE: await process_rename(c, q.message, uid, False)
-        elif st == S_SPLIT_MODE:  await process_split(c, q.message, uid, False)
-        elif st == S_REN_CTC_MODE: await process_ren_ctc(c, q.message, uid, False)
-        elif st == S_MERGE_VCF_MODE: await process_merge(c, q.message, uid, False, ".vcf")
-        elif st == S_MERGE_TXT_MODE: await process_merge(c, q.message, uid, False, ".txt")
+        if st == S_T2V_FILE_MODE: enqueue(process_t2v, c, q.message, uid, False)
+        elif st == S_V2T_MODE:    enqueue(process_v2t, c, q.message, uid, False)
+        elif st == S_RENAME_MODE: enqueue(process_rename, c, q.message, uid, False)
+        elif st == S_SPLIT_MODE:  enqueue(process_split, c, q.message, uid, False)
+        elif st == S_REN_CTC_MODE: enqueue(process_ren_ctc, c, q.message, uid, False)
+        elif st == S_MERGE_VCF_MODE: enqueue(process_merge, c, q.message, uid, False, ".vcf")
+        elif st == S_MERGE_TXT_MODE: enqueue(process_merge, c, q.message, uid, False, ".txt")
+        elif st == S_PIPE_MODE: enqueue(process_pipeline, c, q.message, uid, False)
+        elif st == S_NAVY_MODE: enqueue(process_navy, c, q.message, uid, False)
+
+    elif data == "name_bundle":
+        if st in [S_T2V_FILE_MODE, S_V2T_MODE, S_SPLIT_MODE, S_REN_CTC_MODE, S_PIPE_MODE, S_NAVY_MODE]: user_data[uid]['bundle'] = True
+        if st == S_T2V_FILE_MODE: enqueue(process_t2v, c, q.message, uid, False)
+        elif st == S_V2T_MODE:    enqueue(process_v2t, c, q.message, uid, False)
+        elif st == S_SPLIT_MODE:  enqueue(process_split, c, q.message, uid, False)
+        elif st == S_REN_CTC_MODE: enqueue(process_ren_ctc, c, q.message, uid, False)
+        elif st == S_PIPE_MODE: enqueue(process_pipeline, c, q.message, uid, False)
+        elif st == S_NAVY_MODE: enqueue(process_navy, c, q.message, uid, False)
 
     elif data == "name_custom":
         msg_text = "✏️ **Enter Custom File Name:**"
@@ -311,9 +704,13 @@ async def cb_handler(c, q):
             user_data[uid]['state'] = S_MERGE_VCF_CUSTOM; await q.message.edit(msg_text)
         elif st == S_MERGE_TXT_MODE:
             user_data[uid]['state'] = S_MERGE_TXT_CUSTOM; await q.message.edit(msg_text)
+        elif st == S_PIPE_MODE:
+            user_data[uid]['state'] = S_PIPE_CUSTOM; await q.message.edit(msg_text)
+        elif st == S_NAVY_MODE:
+            user_data[uid]['state'] = S_NAVY_CUSTOM; await q.message.edit(msg_text)
 
 # --- TEXT HANDLER ---
-@app.on_message(filters.text)
+@on_message(filters.text)
 async def text_handler(c, m):
     uid = m.from_user.id
     if uid not in user_data: return
@@ -323,26 +720,28 @@ async def text_handler(c, m):
         raw_name = m.text
         user_data[uid]['c_name'] = clean_contact_name(raw_name)
         user_data[uid]['state'] = S_T2V_FILE_MODE
-        await m.reply(f"📝 **Base Name Set:** `{user_data[uid]['c_name']}`\nContacts will be {user_data[uid]['c_name']} 1, {user_data[uid]['c_name']} 2...\n\n**Select Output File Name Mode:**", reply_markup=NAME_MODE_BTN)
+        await m.reply(f"📝 **Base Name Set:** `{user_data[uid]['c_name']}`\nContacts will be {user_data[uid]['c_name']} 1, {user_data[uid]['c_name']} 2...\n\n**Select Output File Name Mode:**", reply_markup=PARTS_MODE_BTN)
     
     elif st == S_REN_CTC_NAME:
         raw_name = m.text
         user_data[uid]['c_name'] = clean_contact_name(raw_name)
         user_data[uid]['state'] = S_REN_CTC_MODE
-        await m.reply(f"📝 **Base Name Set:** `{user_data[uid]['c_name']}`\n\n**Select Output File Name Mode:**", reply_markup=NAME_MODE_BTN)
+        await m.reply(f"📝 **Base Name Set:** `{user_data[uid]['c_name']}`\n\n**Select Output File Name Mode:**", reply_markup=PARTS_MODE_BTN)
 
     elif st == S_T2V_CUSTOM_NAME:
-        user_data[uid]['custom_name'] = m.text; await process_t2v(c, m, uid, True)
+        user_data[uid]['custom_name'] = m.text; enqueue(process_t2v, c, m, uid, True)
     elif st == S_V2T_CUSTOM:
-        user_data[uid]['custom_name'] = m.text; await process_v2t(c, m, uid, True)
+        user_data[uid]['custom_name'] = m.text; enqueue(process_v2t, c, m, uid, True)
     elif st == S_RENAME_CUSTOM:
-        user_data[uid]['custom_name'] = m.text; await process_rename(c, m, uid, True)
+        user_data[uid]['custom_name'] = m.text; enqueue(process_rename, c, m, uid, True)
     elif st == S_REN_CTC_CUSTOM:
-        user_data[uid]['custom_name'] = m.text; await process_ren_ctc(c, m, uid, True)
+        user_data[uid]['custom_name'] = m.text; enqueue(process_ren_ctc, c, m, uid, True)
     elif st == S_MERGE_VCF_CUSTOM:
-        user_data[uid]['custom_name'] = m.text; await process_merge(c, m, uid, True, ".vcf")
+        user_data[uid]['custom_name'] = m.text; enqueue(process_merge, c, m, uid, True, ".vcf")
     elif st == S_MERGE_TXT_CUSTOM:
-        user_data[uid]['custom_name'] = m.text; await process_merge(c, m, uid, True, ".txt")
+        user_data[uid]['custom_name'] = m.text; enqueue(process_merge, c, m, uid, True, ".txt")
+    elif st == S_NAVY_CUSTOM:
+        user_data[uid]['custom_name'] = m.text; enqueue(process_navy, c, m, uid, True)
 
     elif st == S_MSG_INPUT:
         user_data[uid]['msg_content'] = m.text
@@ -354,30 +753,37 @@ async def text_handler(c, m):
         
         # Adding + logically for Message to TXT if lines contain numbers
         msg_content = user_data[uid]['msg_content']
-        new_content = ""
-        for line in msg_content.splitlines():
-            line = line.strip()
-            if line.replace('+', '').isdigit():
-                new_content += "+" + line.replace('+', '') + "\n"
-            else:
-                new_content += line + "\n"
-
-        with open(fname, 'w', encoding='utf-8') as f: f.write(new_content)
-        await m.reply_document(fname)
+        out = await render(fname, convert.text_to_txt, msg_content)
+        await sender.send_document(m, out)
         await m.reply("✅ **Done!**")
-        os.remove(fname)
-        await reset_user(uid)
+        out.discard()
+        finish_job(uid, user_data[uid])
         
     elif st == S_SPLIT_COUNT:
         try:
             count = int(m.text)
+            if count < 1: raise ValueError
             user_data[uid]['split_count'] = count
             user_data[uid]['state'] = S_SPLIT_MODE
-            await m.reply("📝 **Select Output File Name Mode:**", reply_markup=NAME_MODE_BTN)
+            await m.reply("📝 **Select Output File Name Mode:**", reply_markup=PARTS_MODE_BTN)
         except: await m.reply("❌ **Please enter a valid number.**")
     elif st == S_SPLIT_CUSTOM:
         user_data[uid]['custom_name'] = m.text
-        await process_split(c, m, uid, True)
+        enqueue(process_split, c, m, uid, True)
+
+    elif st == S_PIPE_NAME:
+        user_data[uid]['c_name'] = clean_contact_name(m.text)
+        await pipeline_prompt(m.reply, uid)
+    elif st == S_PIPE_COUNT:
+        try:
+            count = int(m.text)
+            if count < 1: raise ValueError
+            user_data[uid]['split_count'] = count
+            await pipeline_prompt(m.reply, uid)
+        except ValueError: await m.reply("❌ **Please enter a valid number.**")
+    elif st == S_PIPE_CUSTOM:
+        user_data[uid]['custom_name'] = m.text
+        enqueue(process_pipeline, c, m, uid, True)
     
     elif st == S_NAVY_TEXT:
         user_data[uid]['text'] = m.text
@@ -386,234 +792,242 @@ async def text_handler(c, m):
     elif st == S_NAVY_FILENAME:
         fname = m.text.strip() + ".vcf"
         raw = user_data[uid]['text']
-        vcf, tn = "", None
-        for l in raw.splitlines():
-            l=l.strip()
-            if not l: continue
-            if l.replace('+','').isdigit() and len(l)>5:
-                if tn:
-                    # Plus Sign Magic Here
-                    clean_num = "+" + l.replace('+', '')
-                    vcf+=f"BEGIN:VCARD\nVERSION:3.0\nFN:{tn}\nTEL;TYPE=CELL:{clean_num}\nEND:VCARD\n"
-                    tn=None
-            else: tn=l
-        with open(fname,'w',encoding='utf-8') as f: f.write(vcf)
-        await m.reply_document(fname)
+        out = await render(fname, convert.navy_to_vcf, raw)
+        await sender.send_document(m, out)
         await m.reply("✅ **Done!**")
-        os.remove(fname)
-        await reset_user(uid)
+        out.discard()
+        finish_job(uid, user_data[uid])
 
 # --- PROCESSORS ---
 
+@holds_session
 async def process_t2v(c, m, uid, custom):
-    proc_msg = await m.reply("⚙️ **Processing with Sequential Names & Plus Sign...**")
+    progress.track(await m.reply("⚙️ **Processing with Sequential Names & Plus Sign...**"))
+    job = sender.job(m.chat.id)
     try:
         files = user_data[uid]['files']
         c_name_base = user_data[uid]['c_name']
-        
-        for i, path in enumerate(files):
-            out_name = f"{user_data[uid].get('custom_name')} {i+1}.vcf" if custom else f"{user_data[uid]['original_names'][i]}.vcf"
-            
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f: lines = f.readlines()
-            data = ""
-            
-            counter = 1
-            for num in lines:
-                num = num.strip()
-                if num: 
-                    # Plus Sign Magic Here
-                    clean_num = "+" + num.replace('+', '')
-                    data += f"BEGIN:VCARD\nVERSION:3.0\nFN:{c_name_base} {counter}\nTEL;TYPE=CELL:{clean_num}\nEND:VCARD\n"
-                    counter += 1
-            
-            with open(out_name, 'w', encoding='utf-8') as f: f.write(data)
-            await m.reply_document(out_name)
-            
-            if i == 0:
-                try:
-                    await proc_msg.delete()
-                except:
-                    pass
-            
-            os.remove(out_name)
-            os.remove(path)
-            
+        names = out_names(uid, custom, ".vcf")
+        key = output_key(uid, "t2v", c_name_base, names, bundle_name(uid))
+        if await send_cached(m, job, key) is None:
+            cache_outputs(key, await convert_and_send(m, job, files, names, convert.t2v_file, c_name_base, bundle=bundle_name(uid)))
         await m.reply("✅ **All Files Done.**")
-    except Exception as e: await m.reply(f"❌ Error: {e}")
-    await reset_user(uid)
+    except Exception as e: metrics.failed(); await m.reply(f"❌ Error: {e}")
 
+@holds_session
 async def process_ren_ctc(c, m, uid, custom):
-    proc_msg = await m.reply("⚙️ **Renaming Contacts (Sequential) & Adding Plus Sign...**")
+    progress.track(await m.reply("⚙️ **Renaming Contacts (Sequential) & Adding Plus Sign...**"))
+    job = sender.job(m.chat.id)
     files = user_data[uid]['files']
     new_c_name_base = user_data[uid]['c_name']
     
     try:
-        for i, path in enumerate(files):
-            out_name = f"{user_data[uid].get('custom_name')} {i+1}.vcf" if custom else f"{user_data[uid]['original_names'][i]}.vcf"
-            
-            new_content = ""
-            counter = 1
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    if line.startswith("FN:"):
-                        new_content += f"FN:{new_c_name_base} {counter}\n"
-                        counter += 1
-                    elif "TEL" in line and ":" in line:
-                        # Plus Sign Magic Here
-                        parts = line.split(":", 1)
-                        clean_num = "+" + parts[1].strip().replace('+', '')
-                        new_content += f"{parts[0]}:{clean_num}\n"
-                    else:
-                        new_content += line
-            
-            with open(out_name, 'w', encoding='utf-8') as f: f.write(new_content)
-            await m.reply_document(out_name)
-            
-            if i == 0:
-                try:
-                    await proc_msg.delete()
-                except:
-                    pass
-            
-            os.remove(out_name)
-            os.remove(path)
-            
+        names = out_names(uid, custom, ".vcf")
+        key = output_key(uid, "ren_ctc", new_c_name_base, names, bundle_name(uid))
+        if await send_cached(m, job, key) is None:
+            cache_outputs(key, await convert_and_send(m, job, files, names, convert.ren_ctc_file, new_c_name_base, bundle=bundle_name(uid)))
         await m.reply("✅ **All Files Done.**")
-    except Exception as e: await m.reply(f"❌ Error: {e}")
-    await reset_user(uid)
+    except Exception as e: metrics.failed(); await m.reply(f"❌ Error: {e}")
 
+@holds_session
 async def process_split(c, m, uid, custom):
-    proc_msg = await m.reply("⚙️ **Splitting & Checking Plus Sign...**")
+    progress.track(await m.reply("⚙️ **Splitting & Checking Plus Sign...**"))
+    job = sender.job(m.chat.id)
     try:
         path = user_data[uid]['path']
         limit = user_data[uid]['split_count']
         is_vcf = user_data[uid]['is_vcf']
-        
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f: content = f.read()
+        index = user_data[uid].get('index')
+        if not index:
+            with metrics.phase("index"): index = await run_cpu(convert.index_records, path, is_vcf)
+        size = os.path.getsize(path)
+        out_base = user_data[uid].get('custom_name') if custom else user_data[uid]['original_name']
+        ext = ".vcf" if is_vcf else ".txt"
+        names = [f"{out_base} {i+1}{ext}" for i in range((len(index)+limit-1)//limit)]
 
-        if is_vcf:
-            # Add Plus Sign to all VCF Numbers
-            content = re.sub(r'(TEL.*?:)\s*\+?(\d+)', r'\1+\2', content)
-            items = [x+"END:VCARD\n" for x in content.strip().split("END:VCARD") if "BEGIN:VCARD" in x]
-            ext = ".vcf"
-        else:
-            # Add Plus Sign to all TXT Numbers
-            raw_items = content.splitlines()
-            items = []
-            for x in raw_items:
-                x = x.strip()
-                if x:
-                    if x.replace('+', '').isdigit():
-                        items.append("+" + x.replace('+', '') + "\n")
-                    else:
-                        items.append(x + "\n")
-            ext = ".txt"
-
-        total = (len(items)+limit-1)//limit
-        for i in range(total):
-            chunk = items[i*limit:(i+1)*limit]
-            out_name = f"{user_data[uid].get('custom_name')} {i+1}{ext}" if custom else f"{user_data[uid]['original_name']} {i+1}{ext}"
-            
-            with open(out_name, 'w', encoding='utf-8') as f: f.writelines(chunk)
-            await m.reply_document(out_name)
-            
-            if i == 0:
-                try:
-                    await proc_msg.delete()
-                except:
-                    pass
-            
-            os.remove(out_name)
+        async def conv(i, name):
+            start, end = convert.part_bounds(index, size, limit, i)
+            return await render(name, convert.write_part, path, start, end, is_vcf)
+
+        key = output_key(uid, "split", limit, names, bundle_name(uid))
+        if await send_cached(m, job, key) is None:
+            cache_outputs(key, await deliver(m, job, names, conv, bundle_name(uid)))
         os.remove(path)
         await m.reply("✅ **All Files Done.**")
-    except Exception as e: await m.reply(f"❌ Error: {e}")
-    await reset_user(uid)
+    except Exception as e: metrics.failed(); await m.reply(f"❌ Error: {e}")
 
+@holds_session
 async def process_v2t(c, m, uid, custom):
-    proc_msg = await m.reply("⚙️ **Processing & Adding Plus Sign...**")
+    progress.track(await m.reply("⚙️ **Processing & Adding Plus Sign...**"))
+    job = sender.job(m.chat.id)
     try:
         files = user_data[uid]['files']
-        for i, path in enumerate(files):
-            out_name = f"{user_data[uid].get('custom_name')} {i+1}.txt" if custom else f"{user_data[uid]['original_names'][i]}.txt"
-            nums = []
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                for l in f:
-                    if "TEL" in l: 
-                        raw_num = l.split(':')[-1].strip()
-                        # Plus Sign Magic Here
-                        clean_num = "+" + raw_num.replace('+', '')
-                        nums.append(clean_num)
-            
-            with open(out_name, 'w', encoding='utf-8') as f: f.write("\n".join(nums))
-            await m.reply_document(out_name)
-            
-            if i == 0:
-                try:
-                    await proc_msg.delete()
-                except:
-                    pass
-            
-            os.remove(out_name)
-            os.remove(path)
+        names = out_names(uid, custom, ".txt")
+        key = output_key(uid, "v2t", names, bundle_name(uid))
+        if await send_cached(m, job, key) is None:
+            cache_outputs(key, await convert_and_send(m, job, files, names, convert.v2t_file, bundle=bundle_name(uid)))
+        await m.reply("✅ **All Files Done.**")
+    except Exception as e: metrics.failed(); await m.reply(f"❌ Error: {e}")
+
+@holds_session
+async def process_navy(c, m, uid, custom):
+    progress.track(await m.reply("⚙️ **Pairing Names & Numbers...**"))
+    job = sender.job(m.chat.id)
+    try:
+        files = user_data[uid]['files']
+        names = out_names(uid, custom, ".vcf")
+        key = output_key(uid, "navy", names, bundle_name(uid))
+        if await send_cached(m, job, key) is None:
+            cache_outputs(key, await convert_and_send(m, job, files, names, convert.navy_file, bundle=bundle_name(uid)))
         await m.reply("✅ **All Files Done.**")
-    except Exception as e: await m.reply(f"❌ Error: {e}")
-    await reset_user(uid)
+    except Exception as e: metrics.failed(); await m.reply(f"❌ Error: {e}")
 
+@holds_session
 async def process_rename(c, m, uid, custom):
-    proc_msg = await m.reply("⚙️ **Processing...**")
+    progress.track(await m.reply("⚙️ **Processing...**"))
+    job = sender.job(m.chat.id)
     try:
         files = user_data[uid]['files']
-        for i, path in enumerate(files):
-            ext = user_data[uid]['exts'][i]
-            new_name = f"{user_data[uid].get('custom_name')} {i+1}{ext}" if custom else f"{user_data[uid]['original_names'][i]}{ext}"
-            os.rename(path, new_name)
-            await m.reply_document(new_name)
-            
-            if i == 0:
-                try:
-                    await proc_msg.delete()
-                except:
-                    pass
-            
-            os.remove(new_name)
+        exts = user_data[uid]['exts']
+        names = [f"{user_data[uid].get('custom_name')} {i+1}{exts[i]}" if custom else f"{user_data[uid]['original_names'][i]}{exts[i]}" for i in range(len(files))]
+        key = output_key(uid, "rename", names)
+        if await send_cached(m, job, key) is None:
+            progress.expect(len(files))
+            up = Uploader(m, job)
+            try:
+                # Renaming is just the upload file name; the download is sent as-is
+                for i, path in enumerate(files): await up.put(i, Output(names[i], path=path))
+                await up.flush()
+            finally:
+                up.discard()
+            cache_outputs(key, up.file_ids)
         await m.reply("✅ **All Files Done.**")
-    except Exception as e: await m.reply(f"❌ Error: {e}")
-    await reset_user(uid)
+    except Exception as e: metrics.failed(); await m.reply(f"❌ Error: {e}")
 
+@holds_session
 async def process_merge(c, m, uid, custom, ext):
-    proc_msg = await m.reply("⚙️ **Processing Merge & Checking Plus Sign...**")
+    progress.track(await m.reply("⚙️ **Processing Merge & Checking Plus Sign...**"))
+    job = sender.job(m.chat.id)
     files = user_data[uid]['files']
     final_name = f"{user_data[uid].get('custom_name')}{ext}" if custom else f"Merged_Output{ext}"
+    dedup = user_data[uid].get('dedup', False)
     try:
-        with open(final_name, 'w', encoding='utf-8') as outfile:
-            for path in files:
-                with open(path, 'r', encoding='utf-8', errors='ignore') as infile:
-                    if ext == ".vcf":
-                        content = infile.read()
-                        # Add Plus Sign to VCF Numbers
-                        content = re.sub(r'(TEL.*?:)\s*\+?(\d+)', r'\1+\2', content)
-                        outfile.write(content)
-                    else:
-                        for line in infile:
-                            line = line.strip()
-                            if line:
-                                # Add Plus Sign to TXT Numbers
-                                if line.replace('+', '').isdigit():
-                                    outfile.write("+" + line.replace('+', '') + "\n")
-                                else:
-                                    outfile.write(line + "\n")
-                os.remove(path)
-        
+        key = output_key(uid, "merge", ext, dedup, final_name)
+        cached = await send_cached(m, job, key)
+        if cached is None:
+            out, removed = await render(final_name, convert.merge_files, files, ext, dedup)
+            for path in files: os.remove(path)
+            progress.report(records=out.count)
+            
+            metrics.output(out)
+            try:
+                with metrics.phase("upload"): msg = await sender.send_document(m, out, job)
+                progress.report(uploaded=out.size)
+            finally:
+                out.discard()
+            cache_outputs(key, sent_file_ids([msg]), {'removed': removed})
+        else: removed = cached.get('removed', 0)
+        await m.reply(f"✅ **Merge Done.**\n🧹 **Duplicates Removed:** `{removed}`" if dedup else "✅ **Merge Done.**")
+    except Exception as e: metrics.failed(); await m.reply(f"❌ Error: {e}")
+
+@holds_session
+async def process_pipeline(c, m, uid, custom):
+    progress.track(await m.reply("⚙️ **Running Pipeline & Checking Plus Sign...**"))
+    job = sender.job(m.chat.id)
+    try:
+        sess = user_data[uid]
+        files, steps, ext = sess['files'], sess['steps'], sess['ext']
+        c_name, dedup, limit = sess.get('c_name'), sess.get('dedup', False), sess.get('split_count', 0)
+        out_base = sess.get('custom_name') if custom else (sess['original_names'][0] if len(files) == 1 else "Pipeline_Output")
+        key = output_key(uid, "pipeline", steps, c_name, dedup, limit, out_base, bundle_name(uid))
+        cached = await send_cached(m, job, key)
+        if cached is None:
+            # The whole chain runs in one worker call; split parts come back as spilled files
+            outs, removed = await render(out_base, convert.chain_files, files, ext, steps, c_name, dedup, limit, out_base)
+            for path in files: os.remove(path)
+            try:
+                if not outs: raise ValueError("no records found")
+
+                async def conv(i, out):
+                    return out
+
+                cache_outputs(key, await deliver(m, job, outs, conv, bundle_name(uid)), {'removed': removed})
+            finally:
+                for out in outs: out.discard()
+        else: removed = cached.get('removed', 0)
+        done = f"✅ **Pipeline Done:** `{' → '.join(steps)}`"
+        await m.reply(f"{done}\n🧹 **Duplicates Removed:** `{removed}`" if dedup else done)
+    except Exception as e: metrics.failed(); await m.reply(f"❌ Error: {e}")
+
+# --- WORKER ROLE ---
+PROCESSORS = {fn.__name__: fn for fn in (process_t2v, process_ren_ctc, process_split, process_v2t, process_rename, process_merge, process_pipeline, process_navy)}
+
+def run_claimed(job_id, uid, payload, size, running):
+    # Rebuilds the session from the snapshot and answers the original message
+    sess, fn = payload['session'], PROCESSORS[payload['fn']]
+    running[job_id] = uid
+
+    async def run():
+        status = "failed"
         try:
-            await proc_msg.delete()
-        except:
-            pass
-        
-        await m.reply_document(final_name)
-        await m.reply("✅ **Merge Done.**")
-        os.remove(final_name)
-    except Exception as e: await m.reply(f"❌ Error: {e}")
-    await reset_user(uid)
-
-print("🚀 Bot Started on Server...")
-app.run()
+            m = await app.get_messages(payload['chat_id'], payload['message_id'])
+            user_data[uid] = sess
+            with metrics.job(fn.__name__.removeprefix("process_"), size, time.time() - payload['submitted']) as jm:
+                async with progress.job(): await fn(app, m, uid, *payload['args'])
+            if jm.status == "ok": status = "done"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            print(f"❌ Job error: {e}")
+        finally:
+            running.pop(job_id, None)
+            job_store.finish(job_id, status)
+            finish_job(uid, sess)
+
+    jobs.submit(uid, run, size)
+
+async def notify_reaped(payload):
+    # The worker running this job stopped heartbeating; answer the original request
+    try:
+        await sender.send(payload['chat_id'], app.send_message, payload['chat_id'],
+                          "❌ **Job failed:** the worker running it stopped. Please try again.",
+                          reply_to_message_id=payload['message_id'])
+    except Exception as e:
+        print(f"🛠 Reap notice error: {e}")
+
+async def work():
+    # Claims jobs while local slots are free; cancellations requested through
+    # /reset on the bot reach us with the heartbeat
+    me, running = f"{socket.gethostname()}:{os.getpid()}", {}
+    while True:
+        try:
+            for payload in job_store.reap(): spawn(notify_reaped(payload))
+            for job_id in job_store.heartbeat(list(running)):
+                if job_id in running: jobs.cancel(running[job_id])
+            while len(jobs.waiting) + len(jobs.running) < jobs.workers and (row := job_store.claim(me)):
+                run_claimed(*row, running)
+        except Exception as e:
+            print(f"🛠 Worker error: {e}")
+        await asyncio.sleep(JOB_POLL)
+
+async def main():
+    async with app:
+        if ROLE == "worker":
+            tasks = [asyncio.create_task(work())]
+        else:
+            # Queued jobs' inputs belong to the shared store until a worker finishes them
+            tasks = [asyncio.create_task(user_data.janitor(SCRATCH_ROOT, refs=job_store.referenced_files if job_store else None))]
+        metrics_server = await metrics.start_server()
+        print("🛠 Worker Started..." if ROLE == "worker" else "🚀 Bot Started on Server...")
+        await idle()
+        for task in tasks: task.cancel()
+        if metrics_server: metrics_server.close()
+    user_data.flush()
+
+if __name__ == "__main__":
+    setup()
+    try:
+        app.run(main())
+    finally:
+        shutdown_pool()
@@ -0,0 +1,210 @@
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+# --- METRICS ---
+# In-process histograms, counters and gauges, with no external dependencies.
+# Processors run inside job() and the helpers underneath them wrap their work
+# in phase(). A ContextVar carries the current job, so pipeline tasks started
+# by the job are timed against it too. Read them through /stats, or in
+# Prometheus text format on METRICS_HOST:METRICS_PORT when the port is set.
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+TIME_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+BYTES_BUCKETS = tuple(1 << s for s in range(10, 33, 2))
+RECORD_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+def _labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name, self.help, self.buckets = name, help, buckets
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        s = self.series.get(key)
+        if s is None: s = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        s[0][bisect_left(self.buckets, value)] += 1
+        s[1] += value
+        s[2] += 1
+
+    def quantile(self, q, key):
+        # Linear interpolation inside the bucket holding the q-th observation
+        counts, _, n = self.series[key]
+        target, seen = q * n, 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= target:
+                lo = self.buckets[i-1] if i else 0
+                if i == len(self.buckets): return lo
+                return lo + (self.buckets[i] - lo) * (target - seen) / c
+            seen += c
+        return 0
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, n) in sorted(self.series.items()):
+            acc = 0
+            for le, c in zip(self.buckets + ("+Inf",), counts):
+                acc += c
+                out.append(f"{self.name}_bucket{_labels(key, [('le', le)])} {acc}")
+            out.append(f"{self.name}_sum{_labels(key)} {total}")
+            out.append(f"{self.name}_count{_labels(key)} {n}")
+        return out
+
+class Counter:
+    def __init__(self, name, help):
+        self.name, self.help, self.series = name, help, {}
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.series[key] = self.series.get(key, 0) + value
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        out += [f"{self.name}{_labels(key)} {v}" for key, v in sorted(self.series.items())]
+        return out
+
+class Gauge:
+    # Sampled when read, from a callable
+    def __init__(self, name, help, fn):
+        self.name, self.help, self.fn = name, help, fn
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.fn()}"]
+
+JOB_PHASE = Histogram("vcfbot_job_phase_seconds", "Time per job phase (pipelined phases overlap)", TIME_BUCKETS)
+JOB_BYTES_IN = Histogram("vcfbot_job_input_bytes", "Input bytes per job", BYTES_BUCKETS)
+JOB_BYTES_OUT = Histogram("vcfbot_job_output_bytes", "Output bytes per job", BYTES_BUCKETS)
+JOB_RECORDS = Histogram("vcfbot_job_records", "Output records per job", RECORD_BUCKETS)
+JOBS = Counter("vcfbot_jobs_total", "Finished jobs by tool and status")
+DOWNLOAD_SECONDS = Histogram("vcfbot_download_seconds", "Time per document download", TIME_BUCKETS)
+DOWNLOAD_BYTES = Histogram("vcfbot_download_bytes", "Size per downloaded document", BYTES_BUCKETS)
+DOWNLOADS = Counter("vcfbot_downloads_total", "Document downloads by status")
+SENDS = Counter("vcfbot_sent_messages_total", "Documents and messages sent through the sender")
+FLOOD_WAITS = Counter("vcfbot_send_flood_waits_total", "FloodWaits hit while sending")
+FLOOD_SECONDS = Counter("vcfbot_send_flood_wait_seconds_total", "Seconds chats were held by FloodWait")
+SEND_RETRIES = Counter("vcfbot_send_retries_total", "Sends retried after a transient error")
+
+METRICS = [JOB_PHASE, JOB_BYTES_IN, JOB_BYTES_OUT, JOB_RECORDS, JOBS, DOWNLOAD_SECONDS, DOWNLOAD_BYTES, DOWNLOADS,
+           SENDS, FLOOD_WAITS, FLOOD_SECONDS, SEND_RETRIES]
+GAUGES = []
+
+def gauge(name, help, fn):
+    GAUGES.append(Gauge(name, help, fn))
+
+# --- PER-JOB TRACKING ---
+_current = ContextVar("job_metrics", default=None)
+
+class JobMetrics:
+    def __init__(self, tool, bytes_in=0):
+        self.tool, self.bytes_in, self.bytes_out, self.records = tool, bytes_in, 0, 0
+        self.phases, self.status = {}, "ok"
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.monotonic() - t0
+
+    def output(self, outs):
+        for out in outs:
+            self.records += out.count
+            self.bytes_out += out.size
+
+@contextmanager
+def job(tool, bytes_in=0, queued=None):
+    jm, t0 = JobMetrics(tool, bytes_in), time.monotonic()
+    if queued is not None: jm.phases["queue"] = queued
+    token = _current.set(jm)
+    try:
+        yield jm
+    except asyncio.CancelledError:
+        jm.status = "cancelled"
+        raise
+    except BaseException:
+        jm.status = "error"
+        raise
+    finally:
+        _current.reset(token)
+        jm.phases["total"] = time.monotonic() - t0
+        for name, seconds in jm.phases.items(): JOB_PHASE.observe(seconds, tool=tool, phase=name)
+        JOBS.inc(tool=tool, status=jm.status)
+        if jm.status == "ok":
+            JOB_BYTES_IN.observe(jm.bytes_in, tool=tool)
+            JOB_BYTES_OUT.observe(jm.bytes_out, tool=tool)
+            JOB_RECORDS.observe(jm.records, tool=tool)
+
+def phase(name):
+    jm = _current.get()
+    return jm.phase(name) if jm else nullcontext()
+
+def failed():
+    # Processors report errors to the user instead of raising
+    jm = _current.get()
+    if jm: jm.status = "error"
+
+def output(*outs):
+    jm = _current.get()
+    if jm: jm.output(outs)
+
+# --- EXPOSITION ---
+def render():
+    lines = []
+    for metric in METRICS + GAUGES: lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+def _fmt_seconds(s):
+    return f"{s * 1000:.0f}ms" if s < 1 else f"{s:.1f}s"
+
+def summary():
+    # Compact text for /stats: jobs per tool, phase p50/p95, live gauges
+    lines = ["📈 **Bot Stats**", ""]
+    for g in GAUGES: lines.append(f"**{g.help}:** `{g.fn()}`")
+    done = {}
+    for key, n in JOBS.series.items():
+        d = dict(key)
+        done.setdefault(d["tool"], []).append(f"{n:g} {d['status']}")
+    for tool in sorted(done):
+        lines += ["", f"🛠 **{tool}** — {', '.join(sorted(done[tool]))}"]
+        for key in sorted(k for k in JOB_PHASE.series if dict(k)["tool"] == tool):
+            n = JOB_PHASE.series[key][2]
+            lines.append(f"  `{dict(key)['phase']:<8}` p50 `{_fmt_seconds(JOB_PHASE.quantile(0.5, key))}` "
+                         f"p95 `{_fmt_seconds(JOB_PHASE.quantile(0.95, key))}` (n={n})")
+    for key, (_, total, n) in DOWNLOAD_SECONDS.series.items():
+        lines += ["", f"⬇️ **Downloads:** `{n}`, p50 `{_fmt_seconds(DOWNLOAD_SECONDS.quantile(0.5, key))}` "
+                      f"p95 `{_fmt_seconds(DOWNLOAD_SECONDS.quantile(0.95, key))}`"]
+    if SENDS.series:
+        total = lambda c: sum(c.series.values())
+        lines += ["", f"📤 **Sent:** `{total(SENDS):g}`, FloodWaits `{total(FLOOD_WAITS):g}` "
+                      f"(`{total(FLOOD_SECONDS):g}s`), retries `{total(SEND_RETRIES):g}`"]
+    return "\n".join(lines)
+
+async def _serve(reader, writer):
+    try:
+        await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+        body = render().encode()
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                     b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+        await writer.drain()
+    except:
+        pass
+    finally:
+        writer.close()
+
+async def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    # Prometheus scrape endpoint; any path returns the metrics
+    if not port: return None
+    server = await asyncio.start_server(_serve, host, port)
+    print(f"📈 Metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,50 @@
+import os
+import asyncio
+from workers import POOL_SIZE
+
+# --- PIPELINED JOB RUNNER ---
+# convert(i, item) and upload(i, result) run as two stages joined by a bounded
+# queue. Up to `parallel` conversions run at once (one per pool worker by
+# default), so a batch of files spreads over every core while uploads still go
+# out strictly in input order.
+
+PIPE_DEPTH = int(os.getenv("PIPE_DEPTH", "2"))
+PIPE_PARALLEL = int(os.getenv("PIPE_PARALLEL", "0")) or POOL_SIZE
+
+_END = object()
+
+async def run_pipeline(items, convert, upload, discard=None, depth=PIPE_DEPTH, parallel=PIPE_PARALLEL):
+    # The queue holds conversion tasks in input order; its size caps how many
+    # results can be in flight or waiting for upload
+    q = asyncio.Queue(maxsize=max(depth, parallel))
+    # Conversions started and not yet handed to upload, including one the
+    # producer created but was cancelled before it could queue
+    started = {}
+
+    async def produce():
+        try:
+            for i, item in enumerate(items):
+                started[i] = asyncio.create_task(convert(i, item))
+                await q.put((i, started[i]))
+        except Exception as e:
+            await q.put(e)
+            return
+        await q.put(_END)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (job := await q.get()) is not _END:
+            if isinstance(job, Exception): raise job
+            i, task = job
+            # shield: if the job is cancelled, the conversion still finishes below
+            result = await asyncio.shield(task)
+            del started[i]
+            await upload(i, result)
+    finally:
+        if not producer.done():
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+        # Conversions started but never uploaded (job failed midway): let them
+        # finish so their outputs can be discarded instead of leaking
+        for result in await asyncio.gather(*started.values(), return_exceptions=True):
+            if discard and not isinstance(result, BaseException): discard(result)
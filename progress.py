@@ -0,0 +1,99 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from pyrogram.errors import FloodWait
+from sender import TokenBucket, sender
+
+# --- LIVE PROGRESS ---
+# A job's "⚙️ Processing..." message becomes a live status: records converted,
+# files done, bytes uploaded, throughput and ETA. Helpers report() as work
+# finishes; the message is edited from a snapshot at most once per
+# PROGRESS_INTERVAL, so any number of updates cost one edit. Edits across all
+# jobs share one PROGRESS_EDIT_RATE bucket and pause while the chat is in a
+# FloodWait, so they never eat into the upload budget. Like metrics.job(), the
+# job wrapper holds the reporter in a ContextVar and removes the message at the end.
+
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "5"))
+PROGRESS_EDIT_RATE = float(os.getenv("PROGRESS_EDIT_RATE", "1"))
+
+EDITS = TokenBucket(PROGRESS_EDIT_RATE, max(1, int(PROGRESS_EDIT_RATE)))
+
+def fmt_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60}m {seconds % 60}s" if seconds >= 60 else f"{seconds}s"
+
+class Reporter:
+    def __init__(self, msg, interval=PROGRESS_INTERVAL):
+        self.msg, self.interval = msg, interval
+        self.title = (msg.text or "").split("\n")[0]
+        self.total = self.files = self.records = self.uploaded = 0
+        self.t0, self.shown = time.monotonic(), None
+        self.task = asyncio.create_task(self._run())
+
+    def update(self, records=0, files=0, uploaded=0):
+        self.records += records
+        self.files += files
+        self.uploaded += uploaded
+
+    def text(self):
+        elapsed = max(time.monotonic() - self.t0, 1e-6)
+        lines = [self.title, ""]
+        if self.total: lines.append(f"📄 **Files:** `{self.files}/{self.total}`")
+        if self.records: lines.append(f"🔢 **Records:** `{self.records:,}` (`{self.records / elapsed:,.0f}/s`)")
+        if self.uploaded:
+            lines.append(f"⬆️ **Uploaded:** `{self.uploaded / 1e6:.1f} MB` (`{self.uploaded / 1e6 / elapsed:.2f} MB/s`)")
+        if self.total and 0 < self.files < self.total:
+            lines.append(f"⏳ **ETA:** `~{fmt_eta(elapsed / self.files * (self.total - self.files))}`")
+        lines.append(f"⏱ **Elapsed:** `{fmt_eta(elapsed)}`")
+        return "\n".join(lines)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if sender.bucket(self.msg.chat.id).blocked_until > time.monotonic(): continue
+            await EDITS.take()
+            text = self.text()
+            if text == self.shown: continue
+            try:
+                await self.msg.edit(text)
+                self.shown = text
+            except FloodWait as e:
+                EDITS.block(int(getattr(e, "value", 0) or 1))
+            except Exception:
+                pass
+
+    async def close(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        try:
+            await self.msg.delete()
+        except:
+            pass
+
+# --- PER-JOB TRACKING ---
+_current = ContextVar("job_progress", default=None)
+
+@asynccontextmanager
+async def job():
+    # Wraps a queued job; track() inside it binds the status message
+    slot = [None]
+    token = _current.set(slot)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        if slot[0]: await slot[0].close()
+
+def track(msg):
+    slot = _current.get()
+    if slot is not None and slot[0] is None: slot[0] = Reporter(msg)
+
+def expect(total):
+    slot = _current.get()
+    if slot and slot[0]: slot[0].total = total
+
+def report(records=0, files=0, uploaded=0):
+    slot = _current.get()
+    if slot and slot[0]: slot[0].update(records, files, uploaded)
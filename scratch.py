@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+
+# --- SCRATCH SPACE ---
+# Every session downloads into its own directory under SCRATCH_ROOT (point it
+# at a tmpfs mount for fast I/O), so two users sending files with the same name
+# never collide and a reset removes everything with one rmtree. Bytes are
+# reserved from the document's announced size before the download starts and
+# count against a per-user and a global quota until the directory is removed.
+
+SCRATCH_ROOT = os.path.abspath(os.getenv("SCRATCH_ROOT") or os.getenv("DOWNLOAD_DIR", "downloads"))
+USER_QUOTA_BYTES = int(os.getenv("USER_QUOTA_BYTES", str(2 << 30)))
+DISK_QUOTA_BYTES = int(os.getenv("DISK_QUOTA_BYTES", str(8 << 30)))
+
+class QuotaExceeded(Exception):
+    pass
+
+class Scratch:
+    def __init__(self, root=SCRATCH_ROOT, user_quota=USER_QUOTA_BYTES, disk_quota=DISK_QUOTA_BYTES):
+        self.root, self.user_quota, self.disk_quota = root, user_quota, disk_quota
+        # directory -> [uid, reserved bytes]
+        self.dirs = {}
+
+    def create(self, uid):
+        os.makedirs(self.root, exist_ok=True)
+        folder = tempfile.mkdtemp(prefix=f"{uid}-", dir=self.root)
+        self.dirs[folder] = [uid, 0]
+        return folder
+
+    def adopt(self, uid, folder):
+        # Directory of a session restored from SESSION_DB: charge what is on disk
+        size = sum(os.path.getsize(os.path.join(r, n)) for r, _, names in os.walk(folder) for n in names)
+        self.dirs[folder] = [uid, size]
+
+    def user_bytes(self, uid):
+        return sum(size for owner, size in self.dirs.values() if owner == uid)
+
+    def total_bytes(self):
+        return sum(size for _, size in self.dirs.values())
+
+    def reserve(self, folder, size):
+        uid = self.dirs[folder][0]
+        if self.user_quota and self.user_bytes(uid) + size > self.user_quota:
+            raise QuotaExceeded(f"Your files would exceed your {self.user_quota >> 20} MB limit. Send fewer or smaller files.")
+        if self.disk_quota and self.total_bytes() + size > self.disk_quota:
+            raise QuotaExceeded("The bot is out of disk space right now. Try again in a few minutes.")
+        self.dirs[folder][1] += size
+
+    def release(self, folder):
+        # Stops counting the directory without touching it (another process owns it now)
+        self.dirs.pop(folder, None)
+
+    def remove(self, folder):
+        if not folder: return
+        self.release(folder)
+        shutil.rmtree(folder, ignore_errors=True)
@@ -0,0 +1,142 @@
+import os
+import time
+import asyncio
+import metrics
+from contextlib import ExitStack
+from pyrogram.errors import FloodWait, InternalServerError
+from pyrogram.types import InputMediaDocument
+from sink import Output
+
+# --- OUTBOUND SEND SCHEDULER ---
+# Every document we send goes through one token bucket per chat plus a global
+# one. FloodWait sleeps for the requested time and retries (and slows that
+# chat's bucket down), transient errors retry with backoff.
+
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "25"))
+SEND_RETRIES = int(os.getenv("SEND_RETRIES", "5"))
+SEND_MAX_FLOOD_WAIT = int(os.getenv("SEND_MAX_FLOOD_WAIT", "900"))
+MEDIA_GROUP_SIZE = max(1, min(10, int(os.getenv("MEDIA_GROUP_SIZE", "10"))))
+
+TRANSIENT = (InternalServerError, ConnectionError, asyncio.TimeoutError)
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.max_rate, self.rate, self.burst = rate, rate, burst
+        self.tokens, self.stamp = float(burst), time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return now
+
+    async def take(self):
+        while True:
+            now = self._refill()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+            elif self.tokens >= 1:
+                self.tokens -= 1
+                return
+            else:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block(self, seconds):
+        # Telegram told us to wait: drain the bucket and back the rate off
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.rate = max(self.max_rate / 4, self.rate * 0.75)
+
+    def recover(self):
+        self.rate = min(self.max_rate, self.rate * 1.1)
+
+    def idle(self):
+        return self._refill() >= self.blocked_until and self.tokens >= self.burst
+
+class SendJob:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.started = time.monotonic()
+        self.sent = self.bytes = self.retries = self.flood_waits = 0
+        self.flood_seconds = 0.0
+
+    @property
+    def rate(self):
+        return self.sent / max(time.monotonic() - self.started, 1e-6)
+
+    def __str__(self):
+        return (f"chat {self.chat_id}: {self.sent} sent, {self.bytes} bytes, {self.rate:.2f}/s, "
+                f"{self.flood_waits} flood waits ({self.flood_seconds:.0f}s), {self.retries} retries")
+
+class Sender:
+    def __init__(self):
+        self.global_bucket = TokenBucket(SEND_GLOBAL_RATE, max(1, int(SEND_GLOBAL_RATE)))
+        self.chat_buckets = {}
+
+    def bucket(self, chat_id):
+        if chat_id not in self.chat_buckets:
+            if len(self.chat_buckets) > 1000:
+                for k in [k for k, b in self.chat_buckets.items() if b.idle()]: del self.chat_buckets[k]
+            self.chat_buckets[chat_id] = TokenBucket(SEND_CHAT_RATE, SEND_CHAT_BURST)
+        return self.chat_buckets[chat_id]
+
+    def job(self, chat_id):
+        return SendJob(chat_id)
+
+    async def send(self, chat_id, call, *args, job=None, rewind=(), size=0, count=1, **kw):
+        bucket, attempt = self.bucket(chat_id), 0
+        while True:
+            await bucket.take()
+            await self.global_bucket.take()
+            for f in rewind: f.seek(0)
+            try:
+                res = await call(*args, **kw)
+            except FloodWait as e:
+                wait = int(getattr(e, "value", 0) or 1)
+                if wait > SEND_MAX_FLOOD_WAIT: raise
+                bucket.block(wait)
+                metrics.FLOOD_WAITS.inc()
+                metrics.FLOOD_SECONDS.inc(wait)
+                if job: job.flood_waits, job.flood_seconds = job.flood_waits + 1, job.flood_seconds + wait
+                continue
+            except TRANSIENT:
+                attempt += 1
+                if attempt > SEND_RETRIES: raise
+                if job: job.retries += 1
+                metrics.SEND_RETRIES.inc()
+                await asyncio.sleep(min(30, 2 ** attempt))
+                continue
+            bucket.recover()
+            metrics.SENDS.inc(count)
+            if job: job.sent, job.bytes = job.sent + count, job.bytes + size
+            return res
+
+    async def send_document(self, m, document, job=None, **kw):
+        if isinstance(document, Output):
+            # Uploaded straight from memory (or its spill file) under its own name
+            with document.open() as f:
+                return await self.send(m.chat.id, m.reply_document, f, job=job, rewind=(f,),
+                                       size=document.size, file_name=document.name, **kw)
+        return await self.send(m.chat.id, m.reply_document, document, job=job,
+                               size=os.path.getsize(document), **kw)
+
+    async def send_documents(self, m, outputs, job=None):
+        # Up to 10 Outputs as one album: one API call, names and order kept
+        if len(outputs) == 1: return [await self.send_document(m, outputs[0], job)]
+        with ExitStack() as stack:
+            files = [stack.enter_context(o.open()) for o in outputs]
+            return await self.send(m.chat.id, m.reply_media_group, [InputMediaDocument(f) for f in files],
+                                   job=job, rewind=files, size=sum(o.size for o in outputs), count=len(outputs))
+
+    async def send_cached(self, m, file_ids, job=None):
+        # Re-sends earlier uploads by file_id, in albums like the originals; no bytes are uploaded
+        for i in range(0, len(file_ids), MEDIA_GROUP_SIZE):
+            group = file_ids[i:i + MEDIA_GROUP_SIZE]
+            if len(group) == 1: await self.send(m.chat.id, m.reply_document, group[0], job=job)
+            else: await self.send(m.chat.id, m.reply_media_group, [InputMediaDocument(f) for f in group],
+                                  job=job, count=len(group))
+
+sender = Sender()
@@ -0,0 +1,160 @@
+import os
+import time
+import json
+import sqlite3
+import asyncio
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+# --- SESSION STORE ---
+# Drop-in replacement for the user_data dict: sessions idle for SESSION_TTL
+# seconds or pushed out by the SESSION_MAX cap are evicted (and their files
+# cleaned up through on_evict). With SESSION_DB set, sessions are mirrored to
+# SQLite and survive a restart. A background janitor expires sessions and
+# removes downloads that no live session references any more.
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "500"))
+SESSION_DB = os.getenv("SESSION_DB", "")
+JANITOR_INTERVAL = int(os.getenv("JANITOR_INTERVAL", "30"))
+ORPHAN_GRACE = int(os.getenv("ORPHAN_GRACE", "600"))
+
+# Live objects that can't be persisted (download tasks, split index)
+TRANSIENT_KEYS = ('downloads', 'index')
+
+class SessionStore(MutableMapping):
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX, db_path=SESSION_DB, on_evict=None):
+        self.ttl, self.max_sessions, self.on_evict = ttl, max_sessions, on_evict
+        self.data, self.seen = OrderedDict(), {}
+        # uid -> number of jobs holding it
+        self.pinned, self.dirty = {}, set()
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS sessions (uid INTEGER PRIMARY KEY, data TEXT, seen REAL)")
+            self._load()
+
+    # --- mapping ---
+    def __getitem__(self, uid):
+        sess = self.data[uid]
+        self._touch(uid)
+        return sess
+
+    def __setitem__(self, uid, sess):
+        if uid in self.data and self.data[uid] is not sess and uid not in self.pinned: self._evict(uid)
+        self.data[uid] = sess
+        self._touch(uid)
+        self._enforce_cap()
+
+    def __delitem__(self, uid):
+        del self.data[uid]
+        self.seen.pop(uid, None)
+        self.dirty.discard(uid)
+        if self.db:
+            with self.db: self.db.execute("DELETE FROM sessions WHERE uid = ?", (uid,))
+
+    def __contains__(self, uid):
+        if uid in self.data and self._expired(uid): self._evict(uid)
+        return uid in self.data
+
+    def __iter__(self):
+        return iter(list(self.data))
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, uid, default=None):
+        return self[uid] if uid in self else default
+
+    def values(self):
+        return list(self.data.values())
+
+    # --- lifecycle ---
+    def _touch(self, uid):
+        self.data.move_to_end(uid)
+        self.seen[uid] = time.time()
+        # Handlers mutate sessions in place, so any access may be a write
+        self.dirty.add(uid)
+
+    def _expired(self, uid):
+        return uid not in self.pinned and time.time() - self.seen.get(uid, 0) > self.ttl
+
+    def _evict(self, uid):
+        sess = self.data.get(uid)
+        del self[uid]
+        if sess is not None and self.on_evict: self.on_evict(uid, sess)
+
+    def _enforce_cap(self):
+        for uid in list(self.data):
+            if len(self.data) <= self.max_sessions: break
+            if uid not in self.pinned: self._evict(uid)
+
+    def pin(self, uid):
+        # Running jobs hold their session so it can't expire underneath them
+        self.pinned[uid] = self.pinned.get(uid, 0) + 1
+
+    def unpin(self, uid):
+        if self.pinned.get(uid, 0) > 1: self.pinned[uid] -= 1
+        else: self.pinned.pop(uid, None)
+
+    def expire(self):
+        for uid in [u for u in self.data if self._expired(u)]: self._evict(uid)
+
+    # --- persistence ---
+    def _load(self):
+        for uid, data, seen in self.db.execute("SELECT uid, data, seen FROM sessions ORDER BY seen"):
+            self.data[uid], self.seen[uid] = json.loads(data), seen
+
+    def flush(self):
+        if not self.db:
+            self.dirty.clear()
+            return
+        rows = []
+        for uid in self.dirty:
+            if uid in self.data:
+                sess = {k: v for k, v in self.data[uid].items() if k not in TRANSIENT_KEYS}
+                rows.append((uid, json.dumps(sess), self.seen[uid]))
+        self.dirty.clear()
+        with self.db: self.db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", rows)
+
+    # --- janitor ---
+    def referenced_files(self):
+        refs = set()
+        for sess in self.data.values():
+            refs.update(os.path.abspath(p) for p in sess.get('files', []) if p)
+            if sess.get('path'): refs.add(os.path.abspath(sess['path']))
+            for t in sess.get('downloads', []):
+                if t.done() and not t.cancelled() and not t.exception() and t.result(): refs.add(os.path.abspath(t.result()))
+        return refs
+
+    def sweep_orphans(self, folder, refs=None):
+        # refs: optional callable with more paths to keep
+        if not os.path.isdir(folder): return 0
+        keep = self.referenced_files() | (refs() if refs else set())
+        cutoff, removed = time.time() - ORPHAN_GRACE, 0
+        for root, _, names in os.walk(folder):
+            for name in names:
+                path = os.path.abspath(os.path.join(root, name))
+                try:
+                    if path not in keep and os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        # Scratch directories left empty by a crash
+        for root, _, _ in os.walk(folder, topdown=False):
+            try:
+                if root != folder and os.path.getmtime(root) < cutoff: os.rmdir(root)
+            except OSError:
+                pass
+        return removed
+
+    async def janitor(self, folder, interval=JANITOR_INTERVAL, refs=None):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.expire()
+                self.flush()
+                self.sweep_orphans(folder, refs)
+            except Exception as e:
+                print(f"🧹 Janitor error: {e}")
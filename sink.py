@@ -0,0 +1,68 @@
+import io
+import os
+import tempfile
+
+# --- OUTPUT SINKS ---
+# Converters render into a Sink: bytes stay in memory and only spill to a
+# private temp file once they pass SINK_SPILL_BYTES. The finished Output is
+# uploaded as a named file-like object, so nothing is written under the
+# output's own name and two jobs can never collide on a path.
+
+SINK_SPILL_BYTES = int(os.getenv("SINK_SPILL_BYTES", str(8 << 20)))
+SINK_DIR = os.getenv("SINK_DIR") or None
+
+class Output:
+    def __init__(self, name, data=None, path=None, count=0):
+        self.name, self.data, self.path, self.count = name, data, path, count
+
+    @property
+    def size(self):
+        return len(self.data) if self.data is not None else os.path.getsize(self.path)
+
+    def open(self):
+        if self.data is not None:
+            f = io.BytesIO(self.data)
+            f.name = self.name
+            return f
+        f = open(self.path, 'rb')
+        f.raw.name = self.name
+        return f
+
+    def discard(self):
+        self.data = None
+        if self.path and os.path.exists(self.path): os.remove(self.path)
+
+class Sink:
+    # Text-mode, write-only; picklable until first written, so it can be
+    # created in the bot and filled inside a pool worker.
+    def __init__(self, name, spill_dir=SINK_DIR, spill_at=SINK_SPILL_BYTES):
+        self.name, self.spill_dir, self.spill_at = name, spill_dir, spill_at
+        self.buf, self.file, self.path, self.size = io.BytesIO(), None, None, 0
+
+    def write(self, s):
+        b = s.encode('utf-8')
+        self.size += len(b)
+        if self.file is None and self.size > self.spill_at: self._spill()
+        (self.file or self.buf).write(b)
+
+    def _spill(self):
+        fd, self.path = tempfile.mkstemp(suffix=os.path.splitext(self.name)[1], dir=self.spill_dir)
+        self.file = os.fdopen(fd, 'wb')
+        self.file.write(self.buf.getvalue())
+        self.buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None: self.abort()
+
+    def output(self, count=0):
+        if self.file is None: return Output(self.name, data=self.buf.getvalue(), count=count)
+        self.file.close()
+        return Output(self.name, path=self.path, count=count)
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            os.remove(self.path)
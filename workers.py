@@ -0,0 +1,29 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# --- WORKER POOL ---
+# CPU-bound parse/transform/write stages run here so the Pyrogram event loop
+# only awaits results and keeps serving other admins. Spawned children re-run
+# the launching script as __mp_main__, so main.py keeps its setup in setup().
+
+POOL_SIZE = int(os.getenv("POOL_SIZE", "0")) or os.cpu_count() or 1
+
+_pool = None
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: never fork the bot process while Pyrogram threads are running
+        _pool = ProcessPoolExecutor(max_workers=POOL_SIZE, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+async def run_cpu(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), fn, *args)
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None